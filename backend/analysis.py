@@ -0,0 +1,415 @@
+import numpy as np
+
+from binning import STRATEGIES, group_categories
+from fitting import NUM_PARAMETERS, fit_distribution
+from gof import (
+    MAX_BATCH_CASES, MAX_BATCH_ELEMENTS, bin_probabilities, bin_probability_matrix, conclusion, ks_test,
+    chi_square_batch, ks_monte_carlo_setup, parse_parameter_set
+)
+from metrics import stage
+from montecarlo import parse_options, monte_carlo_pvalue
+
+# Lógica de las rutas de análisis, sin dependencias de Flask: cada función recibe el cuerpo
+# JSON ya decodificado (con los datasets resueltos a observedData) y devuelve
+# (respuesta, código HTTP). Así puede ejecutarse tanto en el proceso web como en el pool
+# de procesos de serving.py.
+
+
+def add_monte_carlo_details(details, monte_carlo):
+    details["p_value_method"] = 'monte_carlo'
+    details["mc_replicates"] = monte_carlo["replicates"]
+    details["mc_confidence_interval"] = [round(bound, 6) for bound in monte_carlo["confidence_interval"]]
+    details["mc_stopped_by"] = monte_carlo["stopped_by"]
+
+
+def run_goodness_of_fit_test(data):
+    from scipy.stats import chisquare
+    test_type = data.get('testType')
+    observed_data = data.get('observedData') # [345, 310, ..., 0]
+    distribution_type = data.get('distributionType') # 'poisson' o 'normal'
+    
+    # Parámetros de la distribución teórica
+    lambda_val = data.get('lambda')
+    mean_val = data.get('mean')
+    std_dev_val = data.get('stdDev')
+    # 'asymptotic' (por defecto) o 'monte_carlo' (bootstrap paramétrico, opcional)
+    p_value_method = data.get('pValueMethod', 'asymptotic')
+    # Estrategia de agrupación de categorías: 'forward' (por defecto), 'backward' o 'balanced'
+    grouping_strategy = data.get('groupingStrategy', 'forward')
+
+    results = {
+        "testType": test_type,
+        "distributionType": distribution_type,
+        "statistic": None,
+        "pValue": None,
+        "conclusion": "No se pudo realizar la prueba.",
+        "details": {}
+    }
+
+    monte_carlo_options = None
+    if p_value_method == 'monte_carlo':
+        try:
+            monte_carlo_options = parse_options(data)
+        except (ValueError, TypeError) as e:
+            results["conclusion"] = f"Opciones Monte Carlo inválidas: {e}"
+            return results, 200
+    elif p_value_method != 'asymptotic':
+        results["conclusion"] = "pValueMethod no soportado (use 'asymptotic' o 'monte_carlo')."
+        return results, 200
+    if grouping_strategy not in STRATEGIES:
+        results["conclusion"] = f"groupingStrategy no soportada (use una de: {', '.join(STRATEGIES)})."
+        return results, 200
+
+    # Suma total de los abandonos observados (para escalar las probabilidades teóricas)
+    total_observed_count = sum(observed_data)
+    if total_observed_count == 0:
+        results["conclusion"] = "No hay abandonos observados para analizar (suma total es 0)."
+        return results, 200
+
+    # Convertir a numpy array para facilitar operaciones
+    observed_counts_np = np.array(observed_data)
+    
+    # --- Generación de frecuencias esperadas y agrupación para Chi-cuadrado ---
+    
+    if distribution_type in ('poisson', 'normal'):
+        # Convertir los parámetros una sola vez; K-S los usa más abajo
+        lambda_val = float(lambda_val) if lambda_val is not None else None
+        mean_val = float(mean_val) if mean_val is not None else None
+        std_dev_val = float(std_dev_val) if std_dev_val is not None else None
+    try:
+        expected_probabilities_for_bins = bin_probabilities(
+            distribution_type, lambda_val, mean_val, std_dev_val, len(observed_data)
+        )
+    except ValueError as e:
+        results["conclusion"] = str(e)
+        return results, 200
+
+    # --- NORMALIZACIÓN CRUCIAL PARA CHI-CUADRADO ---
+    # Asegurarse de que la suma de las probabilidades esperadas sea 1.0 (o muy cercana)
+    # y luego escalarlas al total de observaciones.
+    sum_expected_probs = np.sum(expected_probabilities_for_bins)
+    if sum_expected_probs <= 0: # Si la suma es cero o negativa, hay un problema con los parámetros.
+        results["conclusion"] = "Suma de probabilidades esperadas es cero o negativa. Parámetros de distribución podrían ser inadecuados."
+        return results, 200
+
+    # Normalizar las probabilidades para que sumen 1, y luego escalar por el total de observados.
+    normalized_expected_probs = expected_probabilities_for_bins / sum_expected_probs
+    expected_counts_raw = normalized_expected_probs * total_observed_count
+    
+    # --- Agrupación de categorías para Chi-cuadrado ---
+    # group_categories agrupa los datos para asegurar que las frecuencias esperadas >= 5
+    # (o un mínimo configurable, 5 es el estándar de Cochran)
+
+    # Aplicar la agrupación
+    # Aquí es donde `expected_counts_raw` (ya escalado al total de observados) se usa.
+    grouped_observed_np, grouped_expected_np = group_categories(
+        observed_counts_np, expected_counts_raw, strategy=grouping_strategy
+    )
+    
+    # Verificar que no haya bins vacíos o con valores esperados muy bajos después de la agrupación
+    # También asegurarse de que las sumas sigan siendo consistentes después de la agrupación.
+    # SciPy chisquare tiene sus propias validaciones para sumas, pero es bueno ser proactivo.
+    
+    # Si después de agrupar, la suma de esperados difiere mucho de la suma de observados,
+    # algo salió mal en la agrupación o en los datos originales.
+    if not np.isclose(np.sum(grouped_observed_np), np.sum(grouped_expected_np)):
+        results["conclusion"] = f"Error interno: La suma de frecuencias observadas ({np.sum(grouped_observed_np)}) no coincide con la suma de esperadas ({np.sum(grouped_expected_np)}) después de la agrupación. Diferencia porcentual: {abs(np.sum(grouped_observed_np) - np.sum(grouped_expected_np)) / np.sum(grouped_observed_np) * 100:.2f}%"
+        return results, 200
+
+    # Asegurar que no haya ceros en las frecuencias esperadas después de agrupar para evitar NaNs
+    # Esto ya lo hace group_categories con nan_to_num, pero es una doble verificación.
+    if np.any(grouped_expected_np <= 0):
+        # Reemplazar 0s con un valor muy pequeño (ej. 1e-10) para evitar división por cero en chisquare si esto ocurre
+        # Esto es un workaround, la agrupación debería evitarlo idealmente.
+        grouped_expected_np = np.maximum(grouped_expected_np, 1e-10)
+
+
+    # --- Ejecutar la Prueba Seleccionada ---
+    if test_type == 'chi_square':
+        try:
+            # chisquare directamente compara observados y esperados
+            # Si el error "sum of observed must agree with sum of expected" persiste,
+            # forzar la normalización de chisquare (correct=False) puede ayudar, pero no es la solución ideal.
+            # La solución ideal es que tus datos estén correctos antes.
+            with stage('chi_square'):
+                stat, p_value = chisquare(f_obs=grouped_observed_np, f_exp=grouped_expected_np)
+            
+            # Los grados de libertad son (número de bins agrupados - 1)
+            # Si se estimó un parámetro de la distribución (lambda, media, std_dev) a partir de los datos,
+            # se resta un grado de libertad adicional por cada parámetro estimado.
+            # Aquí, los parámetros son dados por el usuario, no estimados de 'observed_data',
+            # por lo que no se restan grados de libertad adicionales por los parámetros.
+            df = len(grouped_observed_np) - 1
+            if df <= 0:
+                # Una sola categoría tras agrupar: sin grados de libertad no hay p-valor (igual que en el lote)
+                p_value = np.nan
+            results["details"]["p_value_method"] = 'asymptotic'
+            if monte_carlo_options is not None and not np.isnan(stat) and not np.isnan(p_value):
+                # Las esperadas agrupadas fijan las categorías; se simula la multinomial agrupada
+                monte_carlo = monte_carlo_pvalue(
+                    'chi_square',
+                    {"expected": grouped_expected_np.astype(float), "n": int(round(total_observed_count))},
+                    stat, **monte_carlo_options
+                )
+                p_value = monte_carlo["p_value"]
+                add_monte_carlo_details(results["details"], monte_carlo)
+            
+            # Asegurar que el estadístico y p-valor no sean NaN si hay problemas con los datos
+            if np.isnan(stat) or np.isnan(p_value):
+                 results["conclusion"] = "Error de cálculo: Estadístico o P-valor Chi-cuadrado resultó en NaN. Datos inadecuados para la prueba."
+                 return results, 200
+
+            results["statistic"] = round(stat, 4)
+            results["pValue"] = round(p_value, 4)
+            results["details"]["degrees_of_freedom"] = df
+            results["details"]["grouped_observed_counts"] = grouped_observed_np.tolist()
+            results["details"]["grouped_expected_counts"] = grouped_expected_np.tolist()
+
+            results["conclusion"] = conclusion(p_value, distribution_type)
+        except Exception as e:
+            import traceback
+            results["conclusion"] = f"Error al ejecutar la prueba Chi-cuadrado: {str(e)}"
+            results["details"]["error_message"] = str(e)
+            results["details"]["traceback"] = traceback.format_exc() # Para depuración
+
+
+    elif test_type == 'kolmogorov_smirnov':
+        try:
+            try:
+                stat, p_value, sample_size, ks_method = ks_test(observed_data, distribution_type, lambda_val, mean_val, std_dev_val)
+            except ValueError as e:
+                results["conclusion"] = str(e)
+                return results, 200
+            
+            results["details"]["p_value_method"] = ks_method
+            if monte_carlo_options is not None and not np.isnan(stat):
+                kind, payload = ks_monte_carlo_setup(distribution_type, lambda_val, sample_size, mean_val, std_dev_val)
+                monte_carlo = monte_carlo_pvalue(kind, payload, stat, **monte_carlo_options)
+                p_value = monte_carlo["p_value"]
+                add_monte_carlo_details(results["details"], monte_carlo)
+
+            if np.isnan(stat) or np.isnan(p_value):
+                 results["conclusion"] = "Error de cálculo: Estadístico o P-valor K-S resultó en NaN. Datos inadecuados para la prueba."
+                 return results, 200
+
+            results["statistic"] = round(stat, 4)
+            results["pValue"] = round(p_value, 4)
+            results["details"]["sample_size_ks"] = sample_size
+            
+            results["conclusion"] = conclusion(p_value, distribution_type)
+        except Exception as e:
+            import traceback
+            results["conclusion"] = f"Error al ejecutar la prueba Kolmogorov-Smirnov: {str(e)}"
+            results["details"]["error_message"] = str(e)
+            results["details"]["traceback"] = traceback.format_exc() 
+        
+    else:
+        results["conclusion"] = "Tipo de prueba no soportado o error en parámetros."
+        return results, 200
+
+    return results, 200
+
+
+def run_goodness_of_fit_tests(data):
+    # Versión por lotes: datasets × conjuntos de parámetros × pruebas en una sola petición.
+    # Chi-cuadrado se evalúa sobre matrices apiladas (una fila por dataset y conjunto de parámetros).
+    observed_sets = data.get('observedData', [])
+    parameter_sets = data.get('parameterSets')
+    test_types = data.get('tests', ['chi_square'])
+    grouping_strategy = data.get('groupingStrategy', 'forward')
+
+    if not isinstance(observed_sets, list) or not isinstance(parameter_sets, list) or not isinstance(test_types, list):
+        return {"error": "observedData, parameterSets y tests deben ser listas"}, 400
+    # Se acepta también un único vector de observados
+    if observed_sets and not isinstance(observed_sets[0], list):
+        observed_sets = [observed_sets]
+    if not all(isinstance(test_type, str) for test_type in test_types):
+        return {"error": "tests debe ser una lista de nombres de prueba"}, 400
+    if not all(isinstance(parameters, dict) for parameters in parameter_sets):
+        return {"error": "parameterSets debe ser una lista de objetos"}, 400
+    test_types = list(dict.fromkeys(test_types))
+    if grouping_strategy not in STRATEGIES:
+        return {"error": f"groupingStrategy no soportada (use una de: {', '.join(STRATEGIES)})"}, 400
+    total_cases = len(observed_sets) * len(parameter_sets) * len(test_types)
+    if total_cases > MAX_BATCH_CASES:
+        return {"error": f"Demasiadas combinaciones ({total_cases}); el máximo es {MAX_BATCH_CASES}"}, 400
+
+    try:
+        observed_arrays = [np.asarray(observed, dtype=float) for observed in observed_sets]
+    except (ValueError, TypeError):
+        return {"error": "observedData contiene valores no numéricos"}, 400
+    if any(observed.ndim != 1 for observed in observed_arrays):
+        return {"error": "Cada conjunto de observedData debe ser una lista de números"}, 400
+    # Las matrices esperadas tienen una fila de len(dataset) bins por dataset y conjunto de parámetros
+    total_elements = sum(len(observed) for observed in observed_arrays) * len(parameter_sets)
+    if total_elements > MAX_BATCH_ELEMENTS:
+        return {"error": f"Lote demasiado grande ({total_elements} bins × parámetros); el máximo es {MAX_BATCH_ELEMENTS}"}, 400
+
+    # results_by_case[(dataset, parámetros, prueba)] -> diccionario con el mismo formato que la prueba individual
+    results_by_case = {}
+    ks_cases = []
+
+    def base_result(test_type, parameters):
+        return {
+            "testType": test_type,
+            "distributionType": parameters.get('distributionType'),
+            "statistic": None,
+            "pValue": None,
+            "conclusion": "No se pudo realizar la prueba.",
+            "details": {}
+        }
+
+    # Cada conjunto de parámetros se valida y convierte una sola vez; las probabilidades
+    # esperadas se calculan después con una llamada vectorizada por distribución
+    parsed_sets = []
+    parameter_errors = []
+    for parameters in parameter_sets:
+        try:
+            parsed_sets.append(parse_parameter_set(parameters))
+            parameter_errors.append(None)
+        except ValueError as e:
+            parsed_sets.append(None)
+            parameter_errors.append(str(e))
+
+    # Agrupar datasets por número de bins para poder apilarlos en una matriz
+    datasets_by_length = {}
+    for dataset_index, observed in enumerate(observed_arrays):
+        datasets_by_length.setdefault(len(observed), []).append(dataset_index)
+
+    for num_bins, dataset_indices in datasets_by_length.items():
+        observed_matrix = np.stack([observed_arrays[i] for i in dataset_indices]) if num_bins else None
+        totals = observed_matrix.sum(axis=1) if num_bins else np.zeros(len(dataset_indices))
+        if num_bins:
+            probability_matrix = bin_probability_matrix(parsed_sets, num_bins)
+            probability_sums = probability_matrix.sum(axis=1)
+
+        chi_rows = []  # (posición, dataset_index, parameter_index) de cada fila de la matriz apilada
+        for parameter_index, parameters in enumerate(parameter_sets):
+            error_message = None
+            if num_bins:
+                error_message = parameter_errors[parameter_index]
+                if error_message is None and probability_sums[parameter_index] <= 0:
+                    error_message = "Suma de probabilidades esperadas es cero o negativa. Parámetros de distribución podrían ser inadecuados."
+
+            for position, dataset_index in enumerate(dataset_indices):
+                for test_type in test_types:
+                    result = base_result(test_type, parameters)
+                    results_by_case[(dataset_index, parameter_index, test_type)] = result
+                    if totals[position] == 0:
+                        result["conclusion"] = "No hay abandonos observados para analizar (suma total es 0)."
+                    elif error_message is not None:
+                        result["conclusion"] = error_message
+                    elif test_type == 'kolmogorov_smirnov':
+                        ks_cases.append((dataset_index, parameter_index))
+                    elif test_type != 'chi_square':
+                        result["conclusion"] = "Tipo de prueba no soportado o error en parámetros."
+
+                if totals[position] != 0 and error_message is None and 'chi_square' in test_types:
+                    chi_rows.append((position, dataset_index, parameter_index))
+
+        if chi_rows:
+            # Frecuencias esperadas por broadcasting: probabilidades normalizadas × total de cada fila
+            positions = np.array([position for position, _, _ in chi_rows])
+            parameter_rows = np.array([parameter_index for _, _, parameter_index in chi_rows])
+            expected_matrix = (
+                probability_matrix[parameter_rows] / probability_sums[parameter_rows][:, None]
+            ) * totals[positions][:, None]
+            statistics, p_values, dfs, grouped = chi_square_batch(
+                observed_matrix[positions], expected_matrix, strategy=grouping_strategy
+            )
+            for row, (_, dataset_index, parameter_index) in enumerate(chi_rows):
+                result = results_by_case[(dataset_index, parameter_index, 'chi_square')]
+                if np.isnan(statistics[row]) or np.isnan(p_values[row]):
+                    result["conclusion"] = "Error de cálculo: Estadístico o P-valor Chi-cuadrado resultó en NaN. Datos inadecuados para la prueba."
+                    continue
+                result["statistic"] = round(float(statistics[row]), 4)
+                result["pValue"] = round(float(p_values[row]), 4)
+                result["details"]["degrees_of_freedom"] = int(dfs[row])
+                result["details"]["grouped_observed_counts"] = grouped[row][0].tolist()
+                result["details"]["grouped_expected_counts"] = grouped[row][1].tolist()
+                result["conclusion"] = conclusion(p_values[row], result["distributionType"])
+
+    # K-S no se apila: se evalúa caso por caso con los parámetros ya validados
+    for dataset_index, parameter_index in ks_cases:
+        result = results_by_case[(dataset_index, parameter_index, 'kolmogorov_smirnov')]
+        _, lambda_val, mean_val, std_dev_val = parsed_sets[parameter_index]
+        try:
+            stat, p_value, sample_size, p_value_method = ks_test(
+                observed_sets[dataset_index], result["distributionType"], lambda_val, mean_val, std_dev_val
+            )
+        except ValueError as e:
+            result["conclusion"] = str(e)
+            continue
+        if np.isnan(stat) or np.isnan(p_value):
+            result["conclusion"] = "Error de cálculo: Estadístico o P-valor K-S resultó en NaN. Datos inadecuados para la prueba."
+            continue
+        result["statistic"] = round(stat, 4)
+        result["pValue"] = round(p_value, 4)
+        result["details"]["sample_size_ks"] = sample_size
+        result["details"]["p_value_method"] = p_value_method
+        result["conclusion"] = conclusion(p_value, result["distributionType"])
+
+    # Respuesta combinada en orden dataset → parámetros → prueba
+    combined = []
+    for dataset_index in range(len(observed_sets)):
+        for parameter_index in range(len(parameter_sets)):
+            for test_type in test_types:
+                result = results_by_case[(dataset_index, parameter_index, test_type)]
+                result["datasetIndex"] = dataset_index
+                result["parameterSetIndex"] = parameter_index
+                combined.append(result)
+
+    return {"count": len(combined), "results": combined}, 200
+
+
+def fit_distribution_with_test(data):
+    # Estima los parámetros (MLE agrupado y método de los momentos) a partir del histograma observado.
+    # Con runTest, encadena la prueba Chi-cuadrado restando un grado de libertad por parámetro estimado.
+    observed_data = data.get('observedData')
+    distribution_type = data.get('distributionType')
+    estimator = data.get('estimator', 'mle')
+
+    if estimator not in ('mle', 'methodOfMoments'):
+        return {"error": "estimator debe ser 'mle' o 'methodOfMoments'"}, 400
+    try:
+        fit = fit_distribution(observed_data, distribution_type)
+    except ValueError as e:
+        return {"error": str(e)}, 400
+
+    if data.get('runTest'):
+        parameters = fit[estimator]["parameters"]
+        results = {
+            "testType": 'chi_square',
+            "distributionType": distribution_type,
+            "statistic": None,
+            "pValue": None,
+            "conclusion": "No se pudo realizar la prueba.",
+            "details": {"estimated_parameters": parameters, "estimator": estimator}
+        }
+        observed_counts_np = np.asarray(observed_data, dtype=float)
+        expected_probabilities_for_bins = bin_probabilities(
+            distribution_type, parameters.get('lambda'), parameters.get('mean'), parameters.get('stdDev'),
+            len(observed_counts_np)
+        )
+        total_expected_prob = np.sum(expected_probabilities_for_bins)
+        if not total_expected_prob > 0:
+            # p. ej. la estimación por momentos con desviación 0
+            results["conclusion"] = "Suma de probabilidades esperadas es cero o negativa. Parámetros de distribución podrían ser inadecuados."
+            fit["test"] = results
+            return fit, 200
+        expected_counts_raw = expected_probabilities_for_bins / total_expected_prob * observed_counts_np.sum()
+        statistics, p_values, dfs, grouped = chi_square_batch(
+            observed_counts_np[None, :], expected_counts_raw[None, :], ddof=NUM_PARAMETERS[distribution_type]
+        )
+        if np.isnan(statistics[0]) or np.isnan(p_values[0]):
+            results["conclusion"] = "Error de cálculo: Estadístico o P-valor Chi-cuadrado resultó en NaN. Datos inadecuados para la prueba."
+        else:
+            results["statistic"] = round(float(statistics[0]), 4)
+            results["pValue"] = round(float(p_values[0]), 4)
+            results["details"]["degrees_of_freedom"] = int(dfs[0])
+            results["details"]["grouped_observed_counts"] = grouped[0][0].tolist()
+            results["details"]["grouped_expected_counts"] = grouped[0][1].tolist()
+            results["conclusion"] = conclusion(p_values[0], distribution_type)
+        fit["test"] = results
+
+    return fit, 200
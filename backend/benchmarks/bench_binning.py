@@ -0,0 +1,108 @@
+"""Agrupación de categorías: bucle original por bin vs. binning.py (sumas acumuladas).
+
+Verifica las propiedades de la agrupación sobre histogramas aleatorios (totales
+conservados, grupos >= min_expected, igualdad con el bucle original hacia adelante,
+lotes == filas individuales) y mide el tiempo de ambos caminos.
+
+Uso (desde backend/):
+    python benchmarks/bench_binning.py
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from binning import STRATEGIES, group_categories, group_categories_batch  # noqa: E402
+
+
+def legacy_group_categories(obs_counts, exp_counts, min_expected=5):
+    # Bucle original de run_goodness_of_fit_test (sin comentarios)
+    grouped_obs, grouped_exp = [], []
+    current_obs_group = current_exp_group = 0
+    exp_counts = np.nan_to_num(exp_counts, nan=0.0, posinf=0.0, neginf=0.0)
+    for i in range(len(obs_counts)):
+        current_obs_group += obs_counts[i]
+        current_exp_group += exp_counts[i]
+        if (current_exp_group >= min_expected and i < len(obs_counts) - 1) or (i == len(obs_counts) - 1):
+            if current_exp_group > 0:
+                grouped_obs.append(current_obs_group)
+                grouped_exp.append(current_exp_group)
+            current_obs_group = current_exp_group = 0
+    if len(grouped_exp) > 1 and grouped_exp[-1] < min_expected:
+        grouped_exp[-2] += grouped_exp[-1]
+        grouped_obs[-2] += grouped_obs[-1]
+        grouped_exp.pop()
+        grouped_obs.pop()
+    return np.array(grouped_obs), np.array(grouped_exp)
+
+
+def random_histogram(rng):
+    num_bins = int(rng.integers(1, 60))
+    expected = rng.exponential(rng.uniform(0.1, 10), num_bins) * (rng.random(num_bins) < 0.8)
+    observed = rng.integers(0, 20, num_bins)
+    return observed, expected, float(rng.choice([0.5, 1, 5, 20]))
+
+
+def check_properties(rng, cases=3000):
+    for _ in range(cases):
+        observed, expected, min_expected = random_histogram(rng)
+        if expected.sum() <= 0:
+            continue
+        for strategy in STRATEGIES:
+            grouped_obs, grouped_exp = group_categories(observed, expected, min_expected, strategy)
+            assert grouped_obs.sum() == observed.sum(), (strategy, observed, expected)
+            assert np.isclose(grouped_exp.sum(), expected.sum()), (strategy, observed, expected)
+            if len(grouped_exp) > 1:
+                assert np.all(grouped_exp >= min_expected * (1 - 1e-12)), (strategy, expected, min_expected)
+
+        # Hacia adelante coincide con el bucle original salvo cuando este perdía observados
+        # (resto final con esperada cero, que el bucle descartaba)
+        legacy_obs, legacy_exp = legacy_group_categories(observed, expected, min_expected)
+        if legacy_obs.sum() == observed.sum():
+            grouped_obs, grouped_exp = group_categories(observed, expected, min_expected)
+            assert np.array_equal(grouped_obs, legacy_obs) and np.allclose(grouped_exp, legacy_exp)
+
+    observed = rng.integers(0, 20, (64, 40))
+    expected = rng.exponential(3, (64, 40))
+    for strategy in STRATEGIES:
+        grouped_obs, grouped_exp, n_groups = group_categories_batch(observed, expected, 5, strategy)
+        for row in range(len(observed)):
+            single_obs, single_exp = group_categories(observed[row], expected[row], 5, strategy)
+            assert np.array_equal(grouped_obs[row, :n_groups[row]], single_obs)
+            assert np.allclose(grouped_exp[row, :n_groups[row]], single_exp)
+    print(f"propiedades verificadas en {cases} histogramas aleatorios y {len(STRATEGIES)} estrategias")
+
+
+def main():
+    rng = np.random.default_rng(0)
+    check_properties(rng)
+
+    print(f"{'caso':<22}{'original (ms)':>15}{'binning (ms)':>15}")
+    for num_bins in (10, 1_000, 10_000, 50_000):
+        expected = rng.exponential(2, num_bins)
+        observed = rng.poisson(expected)
+        start = time.perf_counter()
+        legacy_group_categories(observed, expected)
+        t_legacy = time.perf_counter() - start
+        start = time.perf_counter()
+        group_categories(observed, expected)
+        t_new = time.perf_counter() - start
+        print(f"{f'1 × {num_bins} bins':<22}{t_legacy * 1e3:>15.2f}{t_new * 1e3:>15.2f}")
+
+    expected = rng.exponential(2, (2_000, 10))
+    observed = rng.poisson(expected)
+    start = time.perf_counter()
+    for row in range(len(observed)):
+        legacy_group_categories(observed[row], expected[row])
+    t_legacy = time.perf_counter() - start
+    start = time.perf_counter()
+    group_categories_batch(observed, expected)
+    t_new = time.perf_counter() - start
+    print(f"{'2000 × 10 bins (lote)':<22}{t_legacy * 1e3:>15.2f}{t_new * 1e3:>15.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""Microbenchmark: evaluación punto a punto vs. evaluación por lotes de las curvas.
+
+Uso (desde backend/):
+    python benchmarks/bench_distribution_curves.py
+"""
+import math
+import os
+import sys
+import timeit
+
+from scipy.stats import norm, poisson
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from distributions import normal_curve, normal_labels, poisson_curve, poisson_labels  # noqa: E402
+
+
+def poisson_per_point(lambda_val):
+    # Ruta original: una llamada a scipy por cada k
+    labels, probabilities = [], []
+    max_k = max(15, math.ceil(lambda_val * 3) + 2)
+    for k in range(0, max_k + 1):
+        labels.append(str(k))
+        probabilities.append(poisson.pmf(k, lambda_val))
+    return labels, probabilities
+
+
+def normal_per_point(mean_val, std_dev_val, num_points):
+    labels, probabilities = [], []
+    min_x = mean_val - 4 * std_dev_val
+    max_x = mean_val + 4 * std_dev_val
+    for i in range(num_points + 1):
+        x = min_x + (max_x - min_x) * i / num_points
+        labels.append(f"{x:.2f}")
+        probabilities.append(norm.pdf(x, loc=mean_val, scale=std_dev_val))
+    return labels, probabilities
+
+
+def poisson_batched(lambda_val):
+    # Se llama a la función sin memorizar para medir el cálculo y no la caché
+    k_values, probabilities = poisson_curve.__wrapped__(lambda_val)
+    return poisson_labels(k_values), probabilities.tolist()
+
+
+def normal_batched(mean_val, std_dev_val, num_points):
+    x_values, probabilities = normal_curve.__wrapped__(mean_val, std_dev_val, num_points)
+    return normal_labels(x_values), probabilities.tolist()
+
+
+def best_of(func, *args, repeat=5):
+    number = max(1, int(0.2 / max(timeit.timeit(lambda: func(*args), number=1), 1e-6)))
+    return min(timeit.repeat(lambda: func(*args), number=number, repeat=repeat)) / number
+
+
+def main():
+    cases = [
+        ("poisson λ=2", poisson_per_point, poisson_batched, (2.0,)),
+        ("poisson λ=30", poisson_per_point, poisson_batched, (30.0,)),
+        ("poisson λ=1000", poisson_per_point, poisson_batched, (1000.0,)),
+        ("normal 100 pts", normal_per_point, normal_batched, (0.0, 1.0, 100)),
+        ("normal 10k pts", normal_per_point, normal_batched, (0.0, 1.0, 10_000)),
+    ]
+    print(f"{'caso':<18}{'por punto (ms)':>16}{'por lotes (ms)':>16}{'aceleración':>14}")
+    for name, slow, fast, args in cases:
+        # Ambas rutas deben producir la misma curva
+        slow_labels, slow_probs = slow(*args)
+        fast_labels, fast_probs = fast(*args)
+        assert slow_labels == fast_labels
+        assert all(math.isclose(a, b, rel_tol=1e-12, abs_tol=1e-300) for a, b in zip(slow_probs, fast_probs))
+
+        t_slow = best_of(slow, *args, repeat=3)
+        t_fast = best_of(fast, *args)
+        print(f"{name:<18}{t_slow * 1e3:>16.3f}{t_fast * 1e3:>16.3f}{t_slow / t_fast:>13.1f}x")
+
+
+if __name__ == '__main__':
+    main()
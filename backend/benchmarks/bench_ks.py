@@ -0,0 +1,104 @@
+"""K-S sobre la muestra sintética expandida vs. K-S ponderado sobre (valor, conteo).
+
+Comprueba que ambos caminos producen el mismo estadístico, que el p-valor asintótico
+discreto (Poisson) coincide con el exacto en el umbral entre ambos, y mide el tiempo de
+cada camino para la Normal y la Poisson a medida que crece el total de observaciones.
+
+Uso (desde backend/):
+    python benchmarks/bench_ks.py
+"""
+import os
+import sys
+import time
+
+import numpy as np
+from scipy.stats import kstest, poisson
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gof import (  # noqa: E402
+    KS_DISCRETE_EXACT_MAX_N, ks_test, poisson_ks_pvalue, poisson_ks_pvalue_asymptotic, poisson_support_cdf,
+    poisson_support_size,
+)
+
+
+def ks_expanded(observed_data, distribution_type, lambda_val, mean_val, std_dev_val):
+    # Ruta original: materializar la muestra sintética y llamar a kstest
+    synthetic_sample = []
+    for i, count in enumerate(observed_data):
+        if count > 0:
+            synthetic_sample.extend([i + 1] * count)
+    synthetic_sample_np = np.array(synthetic_sample)
+    if distribution_type == 'poisson':
+        return kstest(synthetic_sample_np, lambda x: poisson.cdf(x, lambda_val))
+    return kstest(synthetic_sample_np, 'norm', args=(mean_val, std_dev_val))
+
+
+def check_agreement(rng, cases=200):
+    for _ in range(cases):
+        observed = rng.integers(0, 60, size=rng.integers(1, 25)).tolist()
+        if sum(observed) == 0:
+            continue
+        lambda_val = float(rng.uniform(0.3, 8))
+        mean_val, std_dev_val = float(rng.uniform(0, 6)), float(rng.uniform(0.5, 3))
+
+        reference = ks_expanded(observed, 'poisson', lambda_val, None, None)
+        stat, _, _, _ = ks_test(observed, 'poisson', lambda_val, None, None)
+        assert stat == reference.statistic, (observed, lambda_val, stat, reference.statistic)
+
+        reference = ks_expanded(observed, 'normal', None, mean_val, std_dev_val)
+        stat, p_value, _, _ = ks_test(observed, 'normal', None, mean_val, std_dev_val)
+        assert stat == reference.statistic, (observed, mean_val, std_dev_val, stat, reference.statistic)
+        assert np.isclose(p_value, reference.pvalue, rtol=1e-10, atol=1e-14)
+    print(f"estadísticos idénticos en {cases} histogramas aleatorios")
+
+
+def check_asymptotic(n=KS_DISCRETE_EXACT_MAX_N):
+    # En el umbral los dos p-valores discretos deben coincidir salvo un error O(1/sqrt(n))
+    worst = 0.0
+    for lambda_val in (0.5, 2.0, 10.0, 50.0):
+        cdf_values = poisson_support_cdf(lambda_val)
+        floor = max(cdf_values[0], np.diff(cdf_values).max())
+        for c in (0.3, 0.8, 1.3):
+            statistic = floor + c / np.sqrt(n)
+            exact = poisson_ks_pvalue(statistic, n, lambda_val)
+            asymptotic = poisson_ks_pvalue_asymptotic(statistic, n, lambda_val)
+            worst = max(worst, abs(exact - asymptotic))
+    assert worst < 0.01, worst
+    print(f"p-valor asintótico discreto a {worst:.4f} del exacto con n = {n}")
+
+
+def time_call(func, *args, repeat=5):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    rng = np.random.default_rng(0)
+    check_agreement(rng)
+    check_asymptotic()
+
+    print(f"{'total':>10}{'distribución':>14}{'expandido (ms)':>16}{'ponderado (ms)':>16}  p-valor")
+    base = np.array([345, 310, 232, 108, 49, 13, 6, 1, 0, 0])
+    for total in (10**3, 10**4, 10**5, 10**6):
+        observed = (base * (total / base.sum())).astype(int).tolist()
+        for distribution_type, args in (('normal', (None, 2.0, 1.5)), ('poisson', (2.0, None, None))):
+            t_expanded = time_call(ks_expanded, observed, distribution_type, *args)
+            t_weighted = time_call(ks_test, observed, distribution_type, *args)
+            method = ks_test(observed, distribution_type, *args)[3]
+            print(f"{total:>10}{distribution_type:>14}{t_expanded * 1e3:>16.2f}{t_weighted * 1e3:>16.2f}  {method}")
+
+    # El costo de la Poisson debe depender del soporte (~ sqrt(lambda)), acotado, no de lambda
+    print(f"\n{'lambda':>10}{'soporte':>12}{'3 obs. (ms)':>14}  p-valor")
+    for lambda_val in (10.0, 1e3, 1e5, 1e6, 1e8, 1e12):
+        elapsed = time_call(ks_test, [1, 1, 1], 'poisson', lambda_val, None, None)
+        method = ks_test([1, 1, 1], 'poisson', lambda_val, None, None)[3]
+        print(f"{lambda_val:>10.0e}{poisson_support_size(lambda_val):>12,}{elapsed * 1e3:>14.2f}  {method}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""Microbenchmark: costo de la instrumentación de /api/metrics por petición.
+
+Ejecuta las mismas peticiones con METRICS_ENABLED=0 y =1 (cada una en su propio proceso,
+porque la bandera se lee al importar) y compara la latencia media con el cliente de pruebas.
+
+Uso (desde backend/):
+    python benchmarks/bench_metrics.py
+"""
+import json
+import os
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+REQUESTS = [
+    ("hello", "GET", "/api/hello", None),
+    ("curva poisson", "POST", "/api/generate_distribution_data", {"distributionType": "poisson", "lambda": 2}),
+    ("chi-cuadrado", "POST", "/api/run_goodness_of_fit_test", {
+        "testType": "chi_square", "distributionType": "poisson", "lambda": 2,
+        "observedData": [345, 310, 232, 108, 49, 13, 6, 1, 0, 0],
+    }),
+]
+ITERATIONS = 1000
+
+
+def measure():
+    from app import app
+    client = app.test_client()
+    timings = {}
+    for name, method, path, body in REQUESTS:
+        for _ in range(50):
+            client.open(path, method=method, json=body)
+        best = float("inf")
+        for _ in range(7):
+            start = time.perf_counter()
+            for _ in range(ITERATIONS):
+                client.open(path, method=method, json=body)
+            best = min(best, (time.perf_counter() - start) / ITERATIONS)
+        timings[name] = best
+    return timings
+
+
+def run_child(enabled):
+    env = dict(os.environ, METRICS_ENABLED="1" if enabled else "0")
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child"], env=env, check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+def main():
+    if "--child" in sys.argv:
+        print(json.dumps(measure()))
+        return
+    disabled = run_child(False)
+    enabled = run_child(True)
+    print(f"{'petición':<16}{'sin métricas (µs)':>20}{'con métricas (µs)':>20}{'sobrecosto (µs)':>18}")
+    for name, _, _, _ in REQUESTS:
+        print(f"{name:<16}{disabled[name] * 1e6:>20.1f}{enabled[name] * 1e6:>20.1f}"
+              f"{(enabled[name] - disabled[name]) * 1e6:>18.1f}")
+
+
+if __name__ == '__main__':
+    main()
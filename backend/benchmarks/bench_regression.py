@@ -0,0 +1,402 @@
+"""Suite de benchmarks y regresión de la API de estadística (cliente de pruebas de Flask).
+
+Para cada caso de la matriz (λ de Poisson y parámetros de la Normal × número de bins ×
+total observado × prueba) mide con el cliente de pruebas:
+  - latencia fría (caché vacía) y percentiles p50 / p90 / p99 en caliente
+  - memoria pico de una petición y bloques que quedan retenidos tras ella (tracemalloc)
+y verifica los resultados contra referencias independientes con SciPy:
+  - Chi-cuadrado: probabilidades por bin calculadas aquí, agrupación con el bucle original
+    (bench_binning.legacy_group_categories) y scipy.stats.chisquare
+  - K-S: estadístico de scipy.stats.kstest sobre la muestra expandida (hasta
+    --reference-max-sample); en la Normal también su p-valor exacto. En Poisson el p-valor
+    de kstest supone una nula continua, así que el exacto discreto se contrasta con una
+    simulación independiente del mismo estadístico (KS_SIMULATIONS réplicas)
+  - curvas: poisson.pmf / norm.pdf sobre la misma malla
+
+Los resultados se comparan con una línea base JSON (baselines/<perfil>.json); la suite
+termina con código 1 si algún caso se vuelve más lento o usa más memoria que el umbral, o
+si algún resultado numérico no coincide con la referencia.
+
+Uso (desde backend/):
+    python benchmarks/bench_regression.py                       # perfil quick
+    python benchmarks/bench_regression.py --profile standard
+    python benchmarks/bench_regression.py --update-baseline     # guardar línea base
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+import zlib
+
+import numpy as np
+import scipy
+from scipy.stats import chisquare, kstest, norm, poisson
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARKS_DIR))
+
+from app import app  # noqa: E402
+from bench_binning import check_properties, legacy_group_categories  # noqa: E402
+from cache import memory_cache  # noqa: E402
+from gof import chi_square_batch, ks_test  # noqa: E402
+
+BASELINE_DIR = os.path.join(BENCHMARKS_DIR, 'baselines')
+
+PROFILES = {
+    # Rápido, para comprobar un cambio antes de hacer commit
+    'quick': {
+        'lambdas': [2.0, 10.0],
+        'normals': [(3.0, 1.5)],
+        'bins': [10, 1_000],
+        'totals': [10**2, 10**4],
+        'curve_lambdas': [2.0, 1000.0],
+        'curve_points': [100, 10_000],
+    },
+    'standard': {
+        'lambdas': [0.5, 2.0, 10.0, 100.0],
+        'normals': [(3.0, 1.5), (50.0, 20.0)],
+        'bins': [10, 100, 1_000, 10_000, 100_000],
+        'totals': [10**2, 10**4, 10**7],
+        'curve_lambdas': [0.5, 2.0, 100.0, 1000.0],
+        'curve_points': [100, 10_000, 100_000],
+    },
+    'full': {
+        'lambdas': [0.5, 2.0, 10.0, 100.0, 1000.0],
+        'normals': [(3.0, 1.5), (50.0, 20.0), (500.0, 100.0)],
+        'bins': [10, 100, 1_000, 10_000, 100_000],
+        'totals': [10**2, 10**3, 10**4, 10**5, 10**6, 10**7],
+        'curve_lambdas': [0.5, 2.0, 10.0, 100.0, 1000.0, 10_000.0],
+        'curve_points': [100, 1_000, 10_000, 100_000],
+    },
+}
+TESTS = ('chi_square', 'kolmogorov_smirnov')
+
+# Repeticiones en caliente por caso: entre MIN y MAX, sin pasar de TIME_BUDGET segundos
+MIN_REPEATS = 5
+MAX_REPEATS = 30
+TIME_BUDGET = 1.5
+# Una regresión debe superar el umbral relativo y además el absoluto (evita falsos
+# positivos por ruido en casos de microsegundos)
+DEFAULT_LATENCY_THRESHOLD = 0.50
+LATENCY_FLOOR_MS = 1.0
+DEFAULT_MEMORY_THRESHOLD = 0.20
+MEMORY_FLOOR_BYTES = 256 * 1024
+# Veces que se vuelve a medir un caso sospechoso antes de declararlo regresión
+CONFIRM_ATTEMPTS = 2
+# Réplicas de la simulación de referencia del p-valor K-S discreto
+KS_SIMULATIONS = 20_000
+
+
+# --- Referencias independientes ---
+
+def reference_bin_probabilities(distribution_type, parameters, num_bins):
+    # Misma convención que la API: bin i = semestre i + 1, el último bin acumula la cola
+    if distribution_type == 'poisson':
+        probabilities = np.append(poisson.pmf(np.arange(1, num_bins), parameters['lambda']),
+                                  poisson.sf(num_bins - 1, parameters['lambda']))
+    else:
+        cdf = norm.cdf(np.arange(num_bins) + 0.5, parameters['mean'], parameters['stdDev'])
+        probabilities = np.append(np.diff(cdf), 1 - cdf[-1])
+    return probabilities
+
+
+def reference_chi_square(observed, distribution_type, parameters):
+    probabilities = reference_bin_probabilities(distribution_type, parameters, len(observed))
+    expected = probabilities / probabilities.sum() * observed.sum()
+    grouped_obs, grouped_exp = legacy_group_categories(observed, expected)
+    statistic, p_value = chisquare(grouped_obs, np.maximum(grouped_exp, 1e-10))
+    return float(statistic), float(p_value), grouped_obs
+
+
+def reference_ks(observed, distribution_type, parameters):
+    sample = np.repeat(np.arange(1, len(observed) + 1), observed)
+    if distribution_type == 'poisson':
+        result = kstest(sample, lambda x: poisson.cdf(x, parameters['lambda']))
+    else:
+        result = kstest(sample, 'norm', args=(parameters['mean'], parameters['stdDev']), method='exact')
+    return float(result.statistic), float(result.pvalue)
+
+
+def simulated_poisson_ks_pvalue(statistic, n, lambda_val, seed):
+    # Simulación directa del estadístico de kstest sobre enteros: D = max(F_n(k) - F(k),
+    # F(k) - F_n(k - 1)) en el soporte 0..K, con la cola P(X >= K) agrupada en K
+    support = np.arange(int(poisson.ppf(1 - 1e-15, lambda_val)) + 2)
+    cdf = poisson.cdf(support, lambda_val)
+    cdf[-1] = 1.0
+    rng = np.random.default_rng(seed)
+    counts = rng.multinomial(n, np.diff(cdf, prepend=0.0), size=KS_SIMULATIONS)
+    empirical = np.cumsum(counts, axis=1) / n
+    previous = np.hstack([np.zeros((KS_SIMULATIONS, 1)), empirical[:, :-1]])
+    simulated = np.maximum((empirical - cdf).max(axis=1), (cdf - previous).max(axis=1))
+    return float(np.mean(simulated >= statistic - 1e-9))
+
+
+def observed_histogram(case_id, distribution_type, parameters, num_bins, total):
+    # Muestra bajo la hipótesis nula, con semilla fija por caso
+    rng = np.random.default_rng(zlib.crc32(case_id.encode()))
+    probabilities = reference_bin_probabilities(distribution_type, parameters, num_bins)
+    return rng.multinomial(total, probabilities / probabilities.sum())
+
+
+class Mismatch(AssertionError):
+    pass
+
+
+def check_close(label, value, reference, rtol=1e-9, atol=1e-12):
+    if not np.isclose(value, reference, rtol=rtol, atol=atol):
+        raise Mismatch(f"{label}: {value!r} != referencia {reference!r}")
+
+
+def check_test_result(case, observed, body, reference_max_sample):
+    distribution_type, parameters = case['distribution'], case['parameters']
+    if case['test'] == 'chi_square':
+        statistic, p_value, grouped_obs = reference_chi_square(observed, distribution_type, parameters)
+        if len(grouped_obs) < 2:
+            # Un solo grupo (p. ej. toda la masa en el último bin): sin grados de libertad,
+            # la API debe rechazar la prueba en lugar de dar un estadístico
+            if body.get('statistic') is not None:
+                raise Mismatch("chi_square: estadístico con un único grupo")
+            return
+        if body.get('statistic') is None:
+            raise Mismatch(f"la prueba no produjo estadístico: {body.get('conclusion')}")
+        # La API redondea a 4 decimales; la comparación a precisión completa se hace con
+        # chi_square_batch, que comparte la agrupación con la prueba individual
+        if body['details'].get('grouped_observed_counts') != grouped_obs.tolist():
+            raise Mismatch("chi_square: agrupación distinta a la del bucle original")
+        check_close("chi_square estadístico (API)", body['statistic'], round(statistic, 4), rtol=0, atol=1e-4)
+        check_close("chi_square p-valor (API)", body['pValue'], round(p_value, 4), rtol=0, atol=1e-4)
+        probabilities = reference_bin_probabilities(distribution_type, parameters, len(observed))
+        expected = probabilities / probabilities.sum() * observed.sum()
+        statistics, p_values, _, _ = chi_square_batch(observed[None, :], expected[None, :])
+        check_close("chi_square estadístico", statistics[0], statistic)
+        check_close("chi_square p-valor", p_values[0], p_value)
+        return
+
+    if body.get('statistic') is None:
+        raise Mismatch(f"la prueba no produjo estadístico: {body.get('conclusion')}")
+    stat, exact_p, n, _ = ks_test(
+        observed.tolist(), distribution_type, parameters.get('lambda'), parameters.get('mean'), parameters.get('stdDev')
+    )
+    if distribution_type == 'poisson':
+        simulated = simulated_poisson_ks_pvalue(stat, n, parameters['lambda'], zlib.crc32(case['id'].encode()))
+        # Cinco errores estándar de la simulación
+        tolerance = 5 * np.sqrt(max(simulated, 1 / KS_SIMULATIONS) * (1 - simulated) / KS_SIMULATIONS) + 1e-4
+        if abs(exact_p - simulated) > tolerance:
+            raise Mismatch(f"K-S p-valor discreto {exact_p!r} fuera de la simulación {simulated!r} ± {tolerance:.4f}")
+    if observed.sum() > reference_max_sample:
+        return
+    statistic, p_value = reference_ks(observed, distribution_type, parameters)
+    check_close("K-S estadístico", stat, statistic, rtol=1e-12)
+    check_close("K-S estadístico (API)", body['statistic'], round(statistic, 4), rtol=0, atol=1e-4)
+    if distribution_type == 'normal':
+        check_close("K-S p-valor", exact_p, p_value, rtol=1e-8)
+
+
+def check_curve(body, parameters):
+    data = np.asarray(body['data'])
+    if 'lambda' in parameters:
+        reference = poisson.pmf(np.arange(len(data)), parameters['lambda'])
+    else:
+        num_points = parameters['numPoints']
+        low, high = parameters['mean'] - 4 * parameters['stdDev'], parameters['mean'] + 4 * parameters['stdDev']
+        reference = norm.pdf(low + (high - low) * np.arange(num_points + 1) / num_points, parameters['mean'], parameters['stdDev'])
+    if len(data) != len(reference) or not np.allclose(data, reference, rtol=1e-12, atol=0):
+        raise Mismatch("curva distinta de la referencia de SciPy")
+
+
+# --- Matriz de casos ---
+
+def build_cases(profile):
+    matrix = PROFILES[profile]
+    cases = []
+    for lambda_val in matrix['curve_lambdas']:
+        parameters = {'lambda': lambda_val}
+        cases.append({'id': f"curve|poisson|lambda={lambda_val:g}", 'endpoint': '/api/generate_distribution_data',
+                      'body': {'distributionType': 'poisson', **parameters}, 'parameters': parameters})
+    for num_points in matrix['curve_points']:
+        parameters = {'mean': 0.0, 'stdDev': 1.0, 'numPoints': num_points}
+        cases.append({'id': f"curve|normal|points={num_points}", 'endpoint': '/api/generate_distribution_data',
+                      'body': {'distributionType': 'normal', **parameters}, 'parameters': parameters})
+
+    parameter_sets = [('poisson', {'lambda': value}, f"lambda={value:g}") for value in matrix['lambdas']]
+    parameter_sets += [('normal', {'mean': mean, 'stdDev': sd}, f"mean={mean:g},sd={sd:g}") for mean, sd in matrix['normals']]
+    for test_type in TESTS:
+        for distribution_type, parameters, label in parameter_sets:
+            for num_bins in matrix['bins']:
+                for total in matrix['totals']:
+                    cases.append({
+                        'id': f"test|{test_type}|{distribution_type}|{label}|bins={num_bins}|total={total}",
+                        'endpoint': '/api/run_goodness_of_fit_test', 'test': test_type,
+                        'distribution': distribution_type, 'parameters': parameters,
+                        'num_bins': num_bins, 'total': total,
+                    })
+    return cases
+
+
+# --- Medición ---
+
+def run_case(client, case, reference_max_sample):
+    observed = None
+    if case['endpoint'] == '/api/run_goodness_of_fit_test':
+        observed = observed_histogram(case['id'], case['distribution'], case['parameters'], case['num_bins'], case['total'])
+        body = {'testType': case['test'], 'distributionType': case['distribution'],
+                'observedData': observed.tolist(), **case['parameters']}
+    else:
+        body = case['body']
+
+    def call():
+        response = client.post(case['endpoint'], json=body)
+        if response.status_code != 200:
+            raise Mismatch(f"HTTP {response.status_code}: {response.get_data(as_text=True)[:200]}")
+        return response
+
+    memory_cache.clear()
+    start = time.perf_counter()
+    response = call()
+    cold = time.perf_counter() - start
+    result = response.get_json()
+    if observed is not None:
+        check_test_result(case, observed, result, reference_max_sample)
+    else:
+        check_curve(result, case['parameters'])
+
+    timings = []
+    deadline = time.perf_counter() + TIME_BUDGET
+    while len(timings) < MAX_REPEATS and (len(timings) < MIN_REPEATS or time.perf_counter() < deadline):
+        start = time.perf_counter()
+        call()
+        timings.append(time.perf_counter() - start)
+
+    # Memoria en una petición aparte: tracemalloc ralentiza y no debe afectar a los tiempos
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    tracemalloc.reset_peak()
+    response = call()
+    peak = tracemalloc.get_traced_memory()[1]
+    del response
+    gc.collect()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    retained = sum(max(stat.count_diff, 0) for stat in after.compare_to(before, 'lineno'))
+
+    timings_ms = np.asarray(timings) * 1e3
+    return {
+        'cold_ms': round(cold * 1e3, 3),
+        'p50_ms': round(float(np.percentile(timings_ms, 50)), 3),
+        'p90_ms': round(float(np.percentile(timings_ms, 90)), 3),
+        'p99_ms': round(float(np.percentile(timings_ms, 99)), 3),
+        'repeats': len(timings),
+        'peak_bytes': int(peak),
+        'retained_blocks': int(retained),
+        'request_bytes': len(json.dumps(body)),
+        'response_bytes': len(json.dumps(result)),
+    }
+
+
+def compare(results, baseline, latency_threshold, memory_threshold):
+    """Devuelve {id del caso: [descripciones]} de los casos que superan los umbrales."""
+    regressions = {}
+    for case_id, current in results.items():
+        previous = baseline.get(case_id)
+        if previous is None:
+            continue
+        found = []
+        # Solo la mediana: p90/p99 se registran pero son demasiado ruidosos para fallar por ellos
+        limit = max(previous['p50_ms'] * (1 + latency_threshold), previous['p50_ms'] + LATENCY_FLOOR_MS)
+        if current['p50_ms'] > limit:
+            found.append(f"p50_ms {previous['p50_ms']:.3f} -> {current['p50_ms']:.3f} ms")
+        limit = max(previous['peak_bytes'] * (1 + memory_threshold), previous['peak_bytes'] + MEMORY_FLOOR_BYTES)
+        if current['peak_bytes'] > limit:
+            found.append(f"peak_bytes {previous['peak_bytes']:,} -> {current['peak_bytes']:,}")
+        if found:
+            regressions[case_id] = found
+    return regressions
+
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'scipy': scipy.__version__,
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+        'cpu_count': os.cpu_count(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--profile', choices=sorted(PROFILES), default='quick')
+    parser.add_argument('--baseline', help="archivo JSON de línea base (por defecto baselines/<perfil>.json)")
+    parser.add_argument('--update-baseline', action='store_true', help="guardar los resultados como nueva línea base")
+    parser.add_argument('--output', help="guardar también los resultados de esta ejecución en este archivo")
+    parser.add_argument('--latency-threshold', type=float, default=DEFAULT_LATENCY_THRESHOLD)
+    parser.add_argument('--memory-threshold', type=float, default=DEFAULT_MEMORY_THRESHOLD)
+    parser.add_argument('--reference-max-sample', type=int, default=10**6,
+                        help="tamaño máximo de muestra expandida para la referencia K-S")
+    parser.add_argument('--filter', default='', help="solo los casos cuyo id contiene este texto")
+    args = parser.parse_args()
+    baseline_path = args.baseline or os.path.join(BASELINE_DIR, f"{args.profile}.json")
+
+    check_properties(np.random.default_rng(0), cases=500)
+    client = app.test_client()
+    results = {}
+    mismatches = []
+    cases = [case for case in build_cases(args.profile) if args.filter in case['id']]
+    for case in cases:
+        try:
+            results[case['id']] = metrics = run_case(client, case, args.reference_max_sample)
+        except Mismatch as e:
+            mismatches.append(f"{case['id']}: {e}")
+            print(f"FALLO  {case['id']}: {e}")
+            continue
+        print(f"{case['id']:<72}{metrics['p50_ms']:>10.3f} ms p50{metrics['p99_ms']:>10.3f} ms p99"
+              f"{metrics['peak_bytes'] / 1024:>12,.0f} KiB")
+
+    report = {'profile': args.profile, 'environment': environment(), 'results': results}
+    regressions = {}
+    if args.update_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(baseline_path)), exist_ok=True)
+        with open(baseline_path, 'w', encoding='utf-8') as handle:
+            json.dump(report, handle, indent=1, sort_keys=True)
+        print(f"línea base guardada en {baseline_path}")
+    elif os.path.exists(baseline_path):
+        with open(baseline_path, encoding='utf-8') as handle:
+            baseline = json.load(handle)
+        if baseline.get('environment') != report['environment']:
+            print("aviso: la línea base se generó en otro entorno; los tiempos pueden no ser comparables")
+        regressions = compare(results, baseline['results'], args.latency_threshold, args.memory_threshold)
+        # Un caso solo cuenta como regresión si se repite al volver a medirlo: se conserva
+        # la mejor mediana de los intentos
+        cases_by_id = {case['id']: case for case in cases}
+        for _ in range(CONFIRM_ATTEMPTS):
+            if not regressions:
+                break
+            for case_id in regressions:
+                retry = run_case(client, cases_by_id[case_id], args.reference_max_sample)
+                results[case_id]['p50_ms'] = min(results[case_id]['p50_ms'], retry['p50_ms'])
+                results[case_id]['peak_bytes'] = min(results[case_id]['peak_bytes'], retry['peak_bytes'])
+            regressions = compare(
+                {case_id: results[case_id] for case_id in regressions}, baseline['results'],
+                args.latency_threshold, args.memory_threshold,
+            )
+    else:
+        print(f"sin línea base en {baseline_path}; use --update-baseline para crearla")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as handle:
+            json.dump(report, handle, indent=1, sort_keys=True)
+    for case_id, found in regressions.items():
+        print(f"REGRESIÓN  {case_id}: {'; '.join(found)}")
+    print(f"{len(results)} casos, {len(mismatches)} discrepancias numéricas, {len(regressions)} regresiones")
+    if mismatches or regressions:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
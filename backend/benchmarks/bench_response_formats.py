@@ -0,0 +1,87 @@
+"""Benchmark: bytes transferidos y tiempo de codificación de /api/generate_distribution_data.
+
+Compara la respuesta JSON original (etiquetas + floats) con el formato columnar binario
+(float64 y float32), MessagePack si está instalado, y cada uno comprimido con gzip / br.
+Los tiempos son de codificación en el servidor (sin la caché de la curva), medidos con
+el cliente de pruebas de Flask.
+
+Uso (desde backend/):
+    python benchmarks/bench_response_formats.py
+"""
+import gzip
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import encoding  # noqa: E402
+from app import app  # noqa: E402
+
+CASES = [
+    ("poisson λ=2", {"distributionType": "poisson", "lambda": 2}),
+    ("poisson λ=1000", {"distributionType": "poisson", "lambda": 1000}),
+    ("normal 100 pts", {"distributionType": "normal", "mean": 0, "stdDev": 1}),
+    ("normal 10k pts", {"distributionType": "normal", "mean": 0, "stdDev": 1, "numPoints": 10_000}),
+    ("normal 100k pts", {"distributionType": "normal", "mean": 0, "stdDev": 1, "numPoints": 100_000}),
+]
+FORMATS = [
+    ("json", encoding.JSON_MIMETYPE, {}),
+    ("bin f64", encoding.CURVE_MIMETYPE, {}),
+    ("bin f32", encoding.CURVE_MIMETYPE, {"dtype": "float32"}),
+] + ([("msgpack f32", encoding.MSGPACK_MIMETYPE, {"dtype": "float32"})] if encoding.msgpack is not None else [])
+ENCODINGS = ["identity", "gzip"] + (["br"] if encoding.brotli is not None else [])
+
+
+def request_time(client, body, headers, repeat=15):
+    # Mediana de varias peticiones; la curva queda en caché tras la primera, así que lo
+    # que se mide es la codificación (etiquetas, serialización y compresión)
+    client.post('/api/generate_distribution_data', json=body, headers=headers)
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        response = client.post('/api/generate_distribution_data', json=body, headers=headers)
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings)), response
+
+
+def check_equivalent(client, body):
+    # El binario reconstruye exactamente las probabilidades y las etiquetas del JSON
+    reference = client.post('/api/generate_distribution_data', json=body).get_json()
+    payload = client.post(
+        '/api/generate_distribution_data', json=body, headers={"Accept": encoding.CURVE_MIMETYPE}
+    ).get_data()
+    x_values, values, decimals = encoding.decode_curve(payload)
+    assert values.tolist() == reference["data"]
+    labels = np.char.mod(f"%.{decimals}f", x_values).tolist()
+    mismatched = sum(a != b for a, b in zip(labels, reference["labels"]))
+    # Las etiquetas de la Normal pueden diferir en el último decimal si x_i cae justo en .xx5
+    assert len(labels) == len(reference["labels"]) and mismatched <= len(labels) // 1000 + 1, mismatched
+
+
+def main():
+    client = app.test_client()
+    header = f"{'caso':<17}{'formato':<13}" + "".join(f"{name + ' (B)':>16}" for name in ENCODINGS) + f"{'ms (identity)':>15}{'ms (' + ENCODINGS[-1] + ')':>12}"
+    print(header)
+    for case_name, body in CASES:
+        check_equivalent(client, body)
+        baseline = None
+        for format_name, mimetype, extra in FORMATS:
+            sizes = []
+            times = []
+            for content_encoding in ENCODINGS:
+                headers = {"Accept": mimetype, "Accept-Encoding": content_encoding}
+                elapsed, response = request_time(client, dict(body, **extra), headers)
+                sizes.append(len(response.get_data()))
+                times.append(elapsed)
+                if content_encoding == "gzip" and response.headers.get("Content-Encoding") == "gzip":
+                    gzip.decompress(response.get_data())
+            baseline = baseline or sizes[0]
+            print(f"{case_name:<17}{format_name:<13}" + "".join(f"{size:>16,}" for size in sizes)
+                  + f"{times[0] * 1e3:>15.3f}{times[-1] * 1e3:>12.3f}   ({baseline / sizes[0]:.1f}x menos bytes sin comprimir)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,238 @@
+import numpy as np
+
+from metrics import timed
+
+# Agrupación de categorías para Chi-cuadrado: se fusionan bins hasta que la frecuencia
+# esperada de cada grupo sea >= min_expected (5 es el estándar de Cochran).
+#
+# Estrategias:
+#   forward   recorre de izquierda a derecha; el resto final se fusiona con el grupo anterior
+#             (mismo resultado que el bucle original de run_goodness_of_fit_test)
+#   backward  igual, de derecha a izquierda
+#   balanced  agrupa las dos colas hacia el bin de mayor esperada; los restos se fusionan
+#             con el grupo del pico
+STRATEGIES = ('forward', 'backward', 'balanced')
+DEFAULT_MIN_EXPECTED = 5
+# Hasta este número de bins, los fines de grupo se calculan por broadcasting para todas
+# las filas; por encima, con un np.searchsorted por fila
+BROADCAST_MAX_BINS = 64
+BROADCAST_BLOCK_ELEMENTS = 4_000_000
+# Hasta este número de bins, un histograma suelto se agrupa con un bucle Python sobre la
+# suma acumulada: para pocos bins el costo fijo de las operaciones vectorizadas domina
+LOOP_MAX_BINS = 64
+
+
+def _forward_labels(expected, min_expected, merge_tail=True):
+    """Etiquetas de grupo (filas × bins) del agrupamiento voraz hacia adelante.
+
+    Con C la suma acumulada de una fila, un grupo que empieza en s termina en el primer
+    j >= s con C[j] - C[s-1] >= min_expected; np.searchsorted da ese j para todos los s a
+    la vez. La cadena de inicios 0 -> siguiente(0) -> ... se marca con saltos duplicados
+    (siguiente∘siguiente, ...), así que el coste es O(n log n) en operaciones vectorizadas
+    en lugar de un bucle Python por bin.
+    """
+    rows, num_bins = expected.shape
+    cumulative = np.cumsum(expected, axis=1)
+    previous = np.zeros_like(cumulative)
+    previous[:, 1:] = cumulative[:, :-1]
+
+    # next_start[r, s]: inicio del grupo que sigue al que empieza en s (num_bins = fin de fila)
+    width = num_bins + 1
+    next_start = np.full((rows, width), num_bins, dtype=np.int64)
+    positions = np.arange(num_bins)
+    thresholds = previous + min_expected
+    if num_bins <= BROADCAST_MAX_BINS:
+        # Histogramas cortos: el equivalente a searchsorted para todas las filas a la vez
+        # contando, por bloques de filas, cuántos acumulados quedan por debajo del umbral
+        block = max(1, BROADCAST_BLOCK_ELEMENTS // max(num_bins * num_bins, 1))
+        ends = np.empty((rows, num_bins), dtype=np.int64)
+        for start in range(0, rows, block):
+            stop = start + block
+            ends[start:stop] = (cumulative[start:stop, None, :] < thresholds[start:stop, :, None]).sum(axis=2)
+    else:
+        ends = np.stack([np.searchsorted(cumulative[row], thresholds[row], side='left') for row in range(rows)]) if rows else np.empty((0, num_bins), dtype=np.int64)
+    next_start[:, :num_bins] = np.minimum(np.maximum(ends, positions) + 1, num_bins)
+
+    # Marcar los inicios alcanzables desde 0 en índices aplanados (fila * width + posición)
+    jump = (next_start + (np.arange(rows) * width)[:, None]).ravel()
+    on_chain = np.zeros(rows * width, dtype=bool)
+    members = np.arange(rows) * width
+    on_chain[members] = True
+    while True:
+        reached = jump[members]
+        new_members = reached[~on_chain[reached]]
+        if len(new_members) == 0:
+            break
+        on_chain[new_members] = True
+        members = np.concatenate([members, new_members])
+        jump = jump[jump]
+
+    starts = on_chain.reshape(rows, width)[:, :num_bins]
+    labels = np.cumsum(starts, axis=1) - 1
+    n_groups = labels[:, -1] + 1 if num_bins else np.zeros(rows, dtype=np.int64)
+
+    if not merge_tail:
+        return labels, n_groups
+
+    # Si el último grupo queda por debajo del mínimo, se fusiona con el penúltimo
+    last_sums = np.where(labels == (n_groups - 1)[:, None], expected, 0).sum(axis=1)
+    merge = (n_groups > 1) & (last_sums < min_expected)
+    labels = np.where(merge[:, None] & (labels == (n_groups - 1)[:, None]), labels - 1, labels)
+    n_groups = n_groups - merge
+    return labels, n_groups
+
+
+def _forward_labels_loop(expected, min_expected, merge_tail=True):
+    """_forward_labels para una sola fila (1-D), recorriendo los grupos uno a uno.
+
+    Usa la misma suma acumulada y las mismas comparaciones, así que las etiquetas coinciden
+    exactamente con las del camino vectorizado.
+    """
+    num_bins = len(expected)
+    cumulative = np.cumsum(expected).tolist()
+    labels = np.empty(num_bins, dtype=np.int64)
+    start = n_groups = 0
+    while start < num_bins:
+        threshold = (cumulative[start - 1] if start else 0.0) + min_expected
+        end = start
+        while end < num_bins and cumulative[end] < threshold:
+            end += 1
+        labels[start:end + 1] = n_groups
+        n_groups += 1
+        start = end + 1
+
+    if merge_tail and n_groups > 1 and np.where(labels == n_groups - 1, expected, 0).sum() < min_expected:
+        labels[labels == n_groups - 1] = n_groups - 2
+        n_groups -= 1
+    return labels, n_groups
+
+
+def _tail_labels(expected, min_expected):
+    # Agrupa una cola hacia el pico; el resto final (< mínimo) se marca para unirse al pico.
+    # Devuelve (etiquetas, grupos completos): las etiquetas == grupos completos son el resto.
+    if len(expected) == 0:
+        return np.empty(0, dtype=np.int64), 0
+    if len(expected) <= LOOP_MAX_BINS:
+        labels, n_groups = _forward_labels_loop(expected, min_expected, merge_tail=False)
+    else:
+        labels, n_groups = _forward_labels(expected[None, :], min_expected, merge_tail=False)
+        labels, n_groups = labels[0], int(n_groups[0])
+    if expected[labels == n_groups - 1].sum() < min_expected:
+        n_groups -= 1
+    return labels, n_groups
+
+
+def _balanced_labels(expected, min_expected):
+    rows, num_bins = expected.shape
+    labels = np.empty((rows, num_bins), dtype=np.int64)
+    n_groups = np.zeros(rows, dtype=np.int64)
+    # Cada fila tiene su propio pico, así que este caso se resuelve fila a fila
+    for row in range(rows if num_bins else 0):
+        exp_row = expected[row]
+        peak = int(np.argmax(exp_row))
+        left_labels, left_groups = _tail_labels(exp_row[:peak], min_expected)
+        right_labels, right_groups = _tail_labels(exp_row[peak + 1:][::-1], min_expected)
+
+        # Izquierda: 0..left_groups-1; pico (con ambos restos): left_groups; derecha hacia fuera
+        row_labels = labels[row]
+        row_labels[:peak] = np.minimum(left_labels, left_groups)
+        row_labels[peak] = left_groups
+        row_labels[peak + 1:] = (left_groups + right_groups - np.minimum(right_labels, right_groups))[::-1]
+        count = left_groups + 1 + right_groups
+
+        # Si el grupo del pico no alcanza el mínimo, se fusiona con el vecino de menor esperada
+        if count > 1 and exp_row[row_labels == left_groups].sum() < min_expected:
+            left_sum = exp_row[row_labels == left_groups - 1].sum() if left_groups else np.inf
+            right_sum = exp_row[row_labels == left_groups + 1].sum() if right_groups else np.inf
+            neighbour = left_groups - 1 if left_sum <= right_sum else left_groups + 1
+            high, low = max(neighbour, left_groups), min(neighbour, left_groups)
+            row_labels[row_labels == high] = low
+            row_labels[row_labels > high] -= 1
+            count -= 1
+        n_groups[row] = count
+    return labels, n_groups
+
+
+def group_labels(expected, min_expected=DEFAULT_MIN_EXPECTED, strategy='forward'):
+    """Etiqueta de grupo de cada bin para una matriz (filas × bins) de frecuencias esperadas.
+
+    Devuelve (labels, n_groups). Las etiquetas son consecutivas de izquierda a derecha.
+    Las filas sin frecuencia esperada positiva no forman ningún grupo (n_groups = 0).
+    """
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Estrategia de agrupación no soportada: {strategy}")
+    # Asegurarse de que las esperadas no contengan NaNs o Infs antes de agrupar
+    expected = np.nan_to_num(np.asarray(expected, dtype=float), nan=0.0, posinf=0.0, neginf=0.0)
+    expected = np.maximum(expected, 0.0)
+
+    if strategy == 'forward':
+        labels, n_groups = _forward_labels(expected, min_expected)
+    elif strategy == 'backward':
+        reversed_labels, n_groups = _forward_labels(expected[:, ::-1], min_expected)
+        labels = (n_groups[:, None] - 1 - reversed_labels)[:, ::-1]
+    else:
+        labels, n_groups = _balanced_labels(expected, min_expected)
+
+    empty = expected.sum(axis=1) <= 0
+    n_groups = np.where(empty, 0, n_groups)
+    return labels, n_groups
+
+
+@timed('grouping')
+def group_categories_batch(obs_counts, exp_counts, min_expected=DEFAULT_MIN_EXPECTED, strategy='forward'):
+    """Agrupa muchos histogramas (filas × bins) en una sola llamada.
+
+    Devuelve (grouped_obs, grouped_exp, n_groups): matrices filas × máximo de grupos,
+    rellenadas con ceros a partir de n_groups[fila]. Los totales de cada fila se conservan.
+    """
+    obs_counts = np.asarray(obs_counts)
+    exp_counts = np.nan_to_num(np.asarray(exp_counts, dtype=float), nan=0.0, posinf=0.0, neginf=0.0)
+    rows = obs_counts.shape[0]
+    labels, n_groups = group_labels(exp_counts, min_expected, strategy)
+    width = int(n_groups.max(initial=0))
+
+    # Sumas por grupo con un único bincount sobre etiquetas aplanadas (fila * width + grupo)
+    valid = np.repeat((n_groups > 0)[:, None], obs_counts.shape[1], axis=1)
+    flat = (labels + (np.arange(rows) * width)[:, None])[valid]
+    grouped_obs = np.bincount(flat, weights=obs_counts[valid].astype(float), minlength=rows * width).reshape(rows, width)
+    grouped_exp = np.bincount(flat, weights=exp_counts[valid], minlength=rows * width).reshape(rows, width)
+    if np.issubdtype(obs_counts.dtype, np.integer):
+        grouped_obs = np.rint(grouped_obs).astype(obs_counts.dtype)
+    return grouped_obs, grouped_exp, n_groups
+
+
+@timed('grouping')
+def _group_categories_loop(obs_counts, exp_counts, min_expected, strategy):
+    # Mismo resultado que group_categories_batch con una fila, sin el costo fijo del lote
+    exp_counts = np.nan_to_num(np.asarray(exp_counts, dtype=float), nan=0.0, posinf=0.0, neginf=0.0)
+    expected = np.maximum(exp_counts, 0.0)
+    if expected.sum() <= 0:
+        n_groups = 0
+        labels = np.zeros(len(expected), dtype=np.int64)
+    elif strategy == 'forward':
+        labels, n_groups = _forward_labels_loop(expected, min_expected)
+    elif strategy == 'backward':
+        reversed_labels, n_groups = _forward_labels_loop(expected[::-1], min_expected)
+        labels = (n_groups - 1 - reversed_labels)[::-1]
+    else:
+        labels, n_groups = _balanced_labels(expected[None, :], min_expected)
+        labels, n_groups = labels[0], int(n_groups[0])
+
+    grouped_obs = np.bincount(labels, weights=obs_counts.astype(float), minlength=n_groups)[:n_groups]
+    grouped_exp = np.bincount(labels, weights=exp_counts, minlength=n_groups)[:n_groups]
+    if np.issubdtype(obs_counts.dtype, np.integer):
+        grouped_obs = np.rint(grouped_obs).astype(obs_counts.dtype)
+    return grouped_obs, grouped_exp
+
+
+def group_categories(obs_counts, exp_counts, min_expected=DEFAULT_MIN_EXPECTED, strategy='forward'):
+    """Agrupa un histograma; devuelve (grouped_obs, grouped_exp) como arreglos 1-D."""
+    obs_counts = np.asarray(obs_counts)
+    if len(obs_counts) <= LOOP_MAX_BINS:
+        if strategy not in STRATEGIES:
+            raise ValueError(f"Estrategia de agrupación no soportada: {strategy}")
+        return _group_categories_loop(obs_counts, exp_counts, min_expected, strategy)
+    grouped_obs, grouped_exp, n_groups = group_categories_batch(
+        obs_counts[None, :], np.asarray(exp_counts)[None, :], min_expected, strategy
+    )
+    return grouped_obs[0, :n_groups[0]], grouped_exp[0, :n_groups[0]]
@@ -0,0 +1,217 @@
+import functools
+import io
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+# Configuración por variables de entorno:
+#   DIST_CACHE_MAX_ENTRIES  número máximo de entradas en memoria (0 desactiva la caché)
+#   DIST_CACHE_MAX_BYTES    memoria máxima (suma de nbytes de los arreglos) en memoria
+#   DIST_CACHE_PATH         archivo SQLite opcional compartido entre workers de gunicorn
+#   DIST_CACHE_DISK_MAX_ENTRIES  número máximo de entradas en el archivo compartido
+DEFAULT_MAX_ENTRIES = 512
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+DEFAULT_DISK_MAX_ENTRIES = 4096
+
+
+def _nbytes(value):
+    return sum(arr.nbytes for arr in value)
+
+
+def _freeze(value):
+    # Los arreglos cacheados se comparten entre peticiones: se marcan de solo lectura
+    for arr in value:
+        arr.flags.writeable = False
+    return value
+
+
+class LRUCache:
+    """Caché LRU en memoria del proceso, acotada por número de entradas y por bytes."""
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._data = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            value = self._data.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        size = _nbytes(value)
+        if self.max_entries <= 0 or size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._bytes -= _nbytes(old)
+            self._data[key] = value
+            self._bytes += size
+            # Desalojar las entradas menos usadas hasta cumplir ambos límites
+            while len(self._data) > self.max_entries or self._bytes > self.max_bytes:
+                _, evicted = self._data.popitem(last=False)
+                self._bytes -= _nbytes(evicted)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._data),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+            }
+
+
+class DiskCache:
+    """Almacén LRU en un archivo SQLite local, compartido por todos los workers de la máquina."""
+
+    def __init__(self, path, max_entries=DEFAULT_DISK_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self.hits = 0
+        self.misses = 0
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "key TEXT PRIMARY KEY, value BLOB NOT NULL, last_used REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used)")
+
+    def _connect(self):
+        # Una conexión por hilo y por proceso (las conexiones no sobreviven a un fork)
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key):
+        try:
+            conn = self._connect()
+            row = conn.execute("SELECT value FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            conn.execute("UPDATE entries SET last_used = ? WHERE key = ?", (time.time(), key))
+        except sqlite3.Error:
+            # La caché compartida es una optimización: ante errores se recalcula
+            self.misses += 1
+            return None
+        self.hits += 1
+        with np.load(io.BytesIO(row[0]), allow_pickle=False) as archive:
+            return tuple(archive[f"arr_{i}"] for i in range(len(archive.files)))
+
+    def put(self, key, value):
+        buffer = io.BytesIO()
+        np.savez(buffer, *value)
+        try:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, last_used) VALUES (?, ?, ?)",
+                (key, buffer.getvalue(), time.time()),
+            )
+            conn.execute(
+                "DELETE FROM entries WHERE key IN ("
+                "SELECT key FROM entries ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+        except sqlite3.Error:
+            pass
+
+    def stats(self):
+        try:
+            entries = self._connect().execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        except sqlite3.Error:
+            entries = None
+        return {
+            "path": self.path,
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+memory_cache = LRUCache(
+    max_entries=int(os.environ.get("DIST_CACHE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES)),
+    max_bytes=int(os.environ.get("DIST_CACHE_MAX_BYTES", DEFAULT_MAX_BYTES)),
+)
+disk_cache = (
+    DiskCache(
+        os.environ["DIST_CACHE_PATH"],
+        max_entries=int(os.environ.get("DIST_CACHE_DISK_MAX_ENTRIES", DEFAULT_DISK_MAX_ENTRIES)),
+    )
+    if os.environ.get("DIST_CACHE_PATH")
+    else None
+)
+
+
+def _normalize(arg):
+    # 2 y 2.0 deben compartir entrada: los números se normalizan a float. Las cadenas se
+    # usan tal cual (los llamadores convierten los parámetros numéricos antes de llegar aquí)
+    if isinstance(arg, str):
+        return arg
+    return float(arg)
+
+
+def memoize(func):
+    """Memoriza funciones que devuelven una tupla de arreglos de NumPy.
+
+    La clave es el nombre de la función más los argumentos normalizados. Se consulta
+    primero la caché en memoria y después, si está configurada, la caché en disco.
+    """
+    @functools.wraps(func)
+    def wrapper(*args):
+        key = (func.__name__,) + tuple(_normalize(arg) for arg in args)
+        value = memory_cache.get(key)
+        if value is not None:
+            return value
+        disk_key = repr(key)
+        if disk_cache is not None:
+            value = disk_cache.get(disk_key)
+        if value is None:
+            value = func(*args)
+            if disk_cache is not None:
+                disk_cache.put(disk_key, value)
+        value = _freeze(value)
+        memory_cache.put(key, value)
+        return value
+
+    return wrapper
+
+
+def cache_stats():
+    return {
+        "memory": memory_cache.stats(),
+        "disk": disk_cache.stats() if disk_cache is not None else None,
+    }
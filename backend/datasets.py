@@ -0,0 +1,271 @@
+import codecs
+import contextlib
+import csv
+import json
+import os
+import threading
+import time
+import uuid
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin bloqueo entre procesos
+    fcntl = None
+
+# Tamaño de cada lectura del cuerpo de la petición
+READ_CHUNK_BYTES = 1024 * 1024
+# Semestre máximo aceptado cuando el dataset no fija numBins (protege la memoria)
+MAX_SEMESTER = 1_000_000
+DEFAULT_FIELD = 'semester'
+
+
+class HistogramDataset:
+    """Histograma de abandonos por semestre que se actualiza de forma incremental."""
+
+    def __init__(self, dataset_id, name, num_bins=None):
+        self.id = dataset_id
+        self.name = name
+        # Con num_bins fijo, los semestres mayores se acumulan en el último bin ("n y más allá")
+        self.num_bins = num_bins
+        self.counts = np.zeros(num_bins or 0, dtype=np.int64)
+        self.rows_ingested = 0
+        self.rows_rejected = 0
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+        self.lock = threading.Lock()
+
+    def add_values(self, semesters):
+        # semesters: arreglo de enteros >= 1 ya validados
+        if len(semesters) == 0:
+            return
+        if self.num_bins:
+            semesters = np.minimum(semesters, self.num_bins)
+        increments = np.bincount(semesters - 1)
+        if len(increments) > len(self.counts):
+            self.counts = np.concatenate([self.counts, np.zeros(len(increments) - len(self.counts), dtype=np.int64)])
+        self.counts[:len(increments)] += increments
+        self.rows_ingested += len(semesters)
+        self.updated_at = time.time()
+
+    def summary(self, include_counts=False):
+        result = {
+            "id": self.id,
+            "name": self.name,
+            "numBins": len(self.counts),
+            "total": int(self.counts.sum()),
+            "rowsIngested": self.rows_ingested,
+            "rowsRejected": self.rows_rejected,
+            "createdAt": self.created_at,
+            "updatedAt": self.updated_at,
+        }
+        if include_counts:
+            result["observedData"] = self.counts.tolist()
+        return result
+
+    def to_json(self):
+        state = self.summary(include_counts=True)
+        state["fixedNumBins"] = self.num_bins
+        return state
+
+    @classmethod
+    def from_json(cls, state):
+        dataset = cls(state["id"], state["name"], state.get("fixedNumBins"))
+        dataset.counts = np.asarray(state["observedData"], dtype=np.int64)
+        dataset.rows_ingested = state["rowsIngested"]
+        dataset.rows_rejected = state["rowsRejected"]
+        dataset.created_at = state["createdAt"]
+        dataset.updated_at = state["updatedAt"]
+        return dataset
+
+
+def _parse_semesters(raw_values):
+    # Convierte una lista de valores crudos en enteros >= 1; devuelve (válidos, rechazados)
+    values = np.asarray(raw_values, dtype=object)
+    try:
+        numbers = np.asarray(values, dtype=float)
+    except (TypeError, ValueError):
+        # Hay valores no numéricos: conversión elemento a elemento solo en este bloque
+        numbers = np.array([_to_float(value) for value in raw_values], dtype=float)
+    valid = np.isfinite(numbers) & (numbers >= 1) & (numbers <= MAX_SEMESTER) & (numbers == np.floor(numbers))
+    return numbers[valid].astype(np.int64), int(np.count_nonzero(~valid))
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def iter_lines(stream):
+    # Lee el cuerpo en bloques y produce listas de líneas completas, sin cargarlo entero en memoria
+    decoder = codecs.getincrementaldecoder('utf-8-sig')(errors='replace')
+    remainder = ''
+    while True:
+        chunk = stream.read(READ_CHUNK_BYTES)
+        text = remainder + decoder.decode(chunk or b'', final=not chunk)
+        lines = text.split('\n')
+        remainder = lines.pop()
+        if lines:
+            yield lines
+        if not chunk:
+            break
+    if remainder.strip():
+        yield [remainder]
+
+
+def iter_csv_values(stream, field):
+    header = None
+    column = None
+    for lines in iter_lines(stream):
+        rows = csv.reader(line.rstrip('\r') for line in lines if line.strip())
+        if header is None:
+            header = next(rows, None)
+            if header is None:
+                continue
+            header = [name.strip() for name in header]
+            if field not in header:
+                raise ValueError(f"La columna '{field}' no está en la cabecera del CSV")
+            column = header.index(field)
+        yield [row[column] if len(row) > column else None for row in rows]
+
+
+def iter_ndjson_values(stream, field):
+    for lines in iter_lines(stream):
+        values = []
+        for line in lines:
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                values.append(None)
+                continue
+            values.append(record.get(field) if isinstance(record, dict) else None)
+        yield values
+
+
+class DatasetStore:
+    """Datasets en memoria, con persistencia opcional en un directorio (DATASETS_DIR).
+
+    Con persistencia, cada dataset se guarda como <id>.json y las ingestas toman un
+    bloqueo de archivo, de modo que varios workers de gunicorn comparten los datasets.
+    """
+
+    def __init__(self, directory=None):
+        self.directory = directory
+        self._datasets = {}
+        self._lock = threading.Lock()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def _path(self, dataset_id):
+        return os.path.join(self.directory, f"{dataset_id}.json")
+
+    def _load(self, dataset_id):
+        try:
+            with open(self._path(dataset_id), encoding='utf-8') as handle:
+                return HistogramDataset.from_json(json.load(handle))
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _save(self, dataset):
+        temporary = self._path(dataset.id) + '.tmp'
+        with open(temporary, 'w', encoding='utf-8') as handle:
+            json.dump(dataset.to_json(), handle)
+        os.replace(temporary, self._path(dataset.id))
+
+    def create(self, name, num_bins=None):
+        dataset = HistogramDataset(uuid.uuid4().hex, name, num_bins)
+        with self._lock:
+            self._datasets[dataset.id] = dataset
+        if self.directory:
+            self._save(dataset)
+        return dataset
+
+    def get(self, dataset_id):
+        if self.directory and all(c in '0123456789abcdef' for c in dataset_id):
+            # Otro worker pudo haber actualizado el dataset: se relee si el archivo es más nuevo
+            stored = self._load(dataset_id)
+            with self._lock:
+                current = self._datasets.get(dataset_id)
+                if stored is not None and (current is None or stored.updated_at > current.updated_at):
+                    self._datasets[dataset_id] = stored
+                elif stored is None and current is not None:
+                    # Eliminado por otro worker
+                    del self._datasets[dataset_id]
+        with self._lock:
+            return self._datasets.get(dataset_id)
+
+    def list(self):
+        if self.directory:
+            for filename in os.listdir(self.directory):
+                if filename.endswith('.json'):
+                    self.get(filename[:-len('.json')])
+        with self._lock:
+            return list(self._datasets.values())
+
+    @contextlib.contextmanager
+    def _file_lock(self, dataset_id):
+        # Bloqueo entre workers de un dataset persistido. Al salir, si el dataset ya no existe
+        # (se eliminó), también se borra su archivo .lock
+        lock_handle = None
+        if self.directory and fcntl is not None:
+            lock_handle = open(self._path(dataset_id) + '.lock', 'w')
+            fcntl.flock(lock_handle, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if self.directory and not os.path.exists(self._path(dataset_id)):
+                try:
+                    os.remove(self._path(dataset_id) + '.lock')
+                except OSError:
+                    pass
+            if lock_handle is not None:
+                fcntl.flock(lock_handle, fcntl.LOCK_UN)
+                lock_handle.close()
+
+    def delete(self, dataset_id):
+        with self._lock:
+            removed = self._datasets.pop(dataset_id, None)
+        if self.directory and all(c in '0123456789abcdef' for c in dataset_id):
+            # Bajo el bloqueo de la ingesta: una carga en curso no vuelve a guardar el dataset
+            with self._file_lock(dataset_id):
+                try:
+                    os.remove(self._path(dataset_id))
+                    return True
+                except OSError:
+                    pass
+        return removed is not None
+
+    def ingest(self, dataset_id, value_chunks):
+        """Aplica cada bloque de valores al histograma a medida que se parsea.
+
+        Devuelve (dataset, filas aceptadas, filas rechazadas) de esta carga.
+        """
+        dataset = self.get(dataset_id)
+        if dataset is None:
+            return None, 0, 0
+        with self._file_lock(dataset_id):
+            if self.directory:
+                # Partir del estado persistido más reciente bajo el bloqueo; si otro worker lo
+                # eliminó mientras tanto no se vuelve a crear
+                dataset = self.get(dataset_id)
+                if dataset is None:
+                    return None, 0, 0
+            accepted = rejected = 0
+            with dataset.lock:
+                for raw_values in value_chunks:
+                    semesters, chunk_rejected = _parse_semesters(raw_values)
+                    dataset.add_values(semesters)
+                    dataset.rows_rejected += chunk_rejected
+                    accepted += len(semesters)
+                    rejected += chunk_rejected
+                if self.directory:
+                    self._save(dataset)
+            return dataset, accepted, rejected
+
+
+store = DatasetStore(os.environ.get('DATASETS_DIR'))
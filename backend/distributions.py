@@ -0,0 +1,80 @@
+import math
+import numpy as np
+
+from cache import memoize
+
+# SciPy se importa dentro de cada función: importar la app no lo carga (tarda ~1 s) hasta el
+# primer cálculo o hasta serving.warm_up(), que lo hace antes de aceptar tráfico.
+
+# Número de puntos por defecto para la curva Normal (intervalos entre -4σ y +4σ)
+DEFAULT_NUM_POINTS = 100
+# Límite superior de puntos por curva para proteger al servidor
+MAX_NUM_POINTS = 100_000
+
+
+@memoize
+def poisson_curve(lambda_val):
+    from scipy.stats import poisson
+    # Generar k desde 0 hasta un valor razonable (ej. lambda * 3 o 15), ajustado para asegurar visibilidad de la cola
+    max_k = max(15, math.ceil(lambda_val * 3) + 2)
+    if max_k + 1 > MAX_NUM_POINTS:
+        raise ValueError("Lambda demasiado grande para generar la curva")
+    k_values = np.arange(0, max_k + 1)
+    # Una sola llamada a scipy evalúa toda la malla
+    return k_values, poisson.pmf(k_values, lambda_val)
+
+
+@memoize
+def normal_curve(mean_val, std_dev_val, num_points):
+    from scipy.stats import norm
+    if not 1 <= num_points <= MAX_NUM_POINTS:
+        raise ValueError("numPoints fuera de rango")
+    min_x = mean_val - 4 * std_dev_val
+    max_x = mean_val + 4 * std_dev_val
+    # Misma malla que el bucle original: min_x + (max_x - min_x) * i / num_points
+    x_values = min_x + (max_x - min_x) * np.arange(num_points + 1) / num_points
+    return x_values, norm.pdf(x_values, loc=mean_val, scale=std_dev_val)
+
+
+def poisson_bin_probability_grid(lambda_values, num_bins):
+    from scipy.stats import poisson
+    # Asumimos que los "semestres" 1 a n-1 corresponden a los conteos k=1 a k=n-1
+    # El último bin (semestre n) incluye la probabilidad de X >= n.
+    # Una fila por cada lambda: (len(lambda_values), num_bins)
+    lambda_values = np.asarray(lambda_values, dtype=float)[:, None]
+    probabilities = np.empty((lambda_values.shape[0], num_bins))
+    probabilities[:, :-1] = poisson.pmf(np.arange(1, num_bins)[None, :], lambda_values)
+    probabilities[:, -1] = poisson.sf(num_bins - 1, lambda_values[:, 0])
+    return probabilities
+
+
+def normal_bin_probability_grid(mean_values, std_dev_values, num_bins):
+    from scipy.stats import norm
+    # Los semestres son rangos (semestre 1 = 0.5 a 1.5, semestre 2 = 1.5 a 2.5, etc.)
+    # y el último bin va de n - 0.5 a infinito. Una fila por cada par (media, desviación).
+    mean_values = np.asarray(mean_values, dtype=float)[:, None]
+    std_dev_values = np.asarray(std_dev_values, dtype=float)[:, None]
+    edges_cdf = norm.cdf(np.arange(num_bins)[None, :] + 0.5, loc=mean_values, scale=std_dev_values)
+    probabilities = np.empty(edges_cdf.shape)
+    probabilities[:, :-1] = np.diff(edges_cdf, axis=1)
+    probabilities[:, -1] = 1 - edges_cdf[:, -1]
+    return probabilities
+
+
+@memoize
+def poisson_bin_probabilities(lambda_val, num_bins):
+    return (poisson_bin_probability_grid([lambda_val], num_bins)[0],)
+
+
+@memoize
+def normal_bin_probabilities(mean_val, std_dev_val, num_bins):
+    return (normal_bin_probability_grid([mean_val], [std_dev_val], num_bins)[0],)
+
+
+def poisson_labels(k_values):
+    return [str(k) for k in k_values.tolist()]
+
+
+def normal_labels(x_values):
+    # Formatea todas las etiquetas en una sola pasada en C (equivale a f"{x:.2f}")
+    return np.char.mod("%.2f", x_values).tolist()
@@ -0,0 +1,115 @@
+import gzip
+import os
+import struct
+
+import numpy as np
+
+try:
+    import msgpack
+except ImportError:  # Dependencia opcional: sin ella solo se ofrecen JSON y el binario crudo
+    msgpack = None
+
+try:
+    import brotli
+except ImportError:  # Sin brotli se comprime con gzip
+    brotli = None
+
+# Formatos de respuesta elegidos por negociación de contenido (cabecera Accept):
+#   application/json            formato original: etiquetas como texto y floats en JSON
+#   application/msgpack         el mismo cuerpo en MessagePack; en las curvas, formato columnar
+#   application/vnd.modelado.curve
+#                               solo curvas: cabecera fija de 32 bytes + probabilidades como
+#                               float32/float64 little-endian (ver CURVE_HEADER)
+#
+# Formato columnar de una curva: en lugar de una etiqueta por punto se envía la malla
+# x_i = xMin + i * step (i = 0..count-1) y cuántos decimales usa la etiqueta (0 en Poisson,
+# 2 en Normal), de modo que el cliente puede reconstruir las etiquetas originales.
+
+JSON_MIMETYPE = 'application/json'
+MSGPACK_MIMETYPE = 'application/msgpack'
+MSGPACK_MIMETYPES = (MSGPACK_MIMETYPE, 'application/x-msgpack')
+CURVE_MIMETYPE = 'application/vnd.modelado.curve'
+
+# magic, versión, bytes por valor (4 u 8), decimales de las etiquetas, count, xMin, step
+CURVE_HEADER = struct.Struct('<4sBBHQdd')
+CURVE_MAGIC = b'MDCV'
+CURVE_VERSION = 1
+DTYPES = {'float64': '<f8', 'float32': '<f4'}
+
+# Solo se comprimen cuerpos de al menos este tamaño: por debajo, la cabecera y el tiempo
+# de compresión cuestan más de lo que se ahorra
+COMPRESS_MIN_BYTES = int(os.environ.get("COMPRESS_MIN_BYTES", 1024))
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+def body_formats():
+    return [JSON_MIMETYPE] + (list(MSGPACK_MIMETYPES) if msgpack is not None else [])
+
+
+def curve_formats():
+    return body_formats() + [CURVE_MIMETYPE]
+
+
+def negotiate(accept_mimetypes, offered):
+    """Formato ofrecido que mejor acepta el cliente; JSON si no pide ninguno en concreto."""
+    # Los navegadores envían */*: el primer ofrecido (JSON) gana en caso de empate
+    best = accept_mimetypes.best_match(offered, default=JSON_MIMETYPE)
+    return MSGPACK_MIMETYPE if best in MSGPACK_MIMETYPES else best
+
+
+def _msgpack_default(value):
+    # Escalares y arreglos de NumPy que quedan en los resultados de las pruebas
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f"Tipo no serializable: {type(value).__name__}")
+
+
+def encode_msgpack(body):
+    return msgpack.packb(body, default=_msgpack_default, use_bin_type=True)
+
+
+def curve_columns(values, x_min, step, label_decimals, dtype='float64'):
+    """Curva en formato columnar; lanza ValueError si el dtype no está soportado."""
+    if dtype not in DTYPES:
+        raise ValueError(f"dtype debe ser uno de: {', '.join(DTYPES)}")
+    return {
+        "xMin": float(x_min),
+        "step": float(step),
+        "count": len(values),
+        "labelDecimals": label_decimals,
+        "dtype": dtype,
+        "data": np.asarray(values).astype(DTYPES[dtype], copy=False).tobytes(),
+    }
+
+
+def encode_curve(columns, mimetype):
+    if mimetype == MSGPACK_MIMETYPE:
+        return encode_msgpack(columns)
+    header = CURVE_HEADER.pack(
+        CURVE_MAGIC, CURVE_VERSION, np.dtype(DTYPES[columns["dtype"]]).itemsize,
+        columns["labelDecimals"], columns["count"], columns["xMin"], columns["step"],
+    )
+    return header + columns["data"]
+
+
+def decode_curve(payload):
+    """Inverso de encode_curve para el binario crudo: devuelve (x_values, values, label_decimals)."""
+    magic, version, itemsize, label_decimals, count, x_min, step = CURVE_HEADER.unpack_from(payload)
+    if magic != CURVE_MAGIC or version != CURVE_VERSION:
+        raise ValueError("No es una curva en formato binario reconocido")
+    values = np.frombuffer(payload, dtype='<f4' if itemsize == 4 else '<f8', count=count, offset=CURVE_HEADER.size)
+    return x_min + step * np.arange(count), values, label_decimals
+
+
+def choose_encoding(accept_encodings):
+    offered = (['br'] if brotli is not None else []) + ['gzip']
+    return accept_encodings.best_match(offered)
+
+
+def compress(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
@@ -0,0 +1,199 @@
+import numpy as np
+
+from metrics import timed
+
+# Número de parámetros estimados por distribución (para AIC/BIC y grados de libertad)
+NUM_PARAMETERS = {'poisson': 1, 'normal': 2}
+# Tamaño de la malla de candidatos
+POISSON_GRID_SIZE = 256
+NORMAL_GRID_SIZE = 64
+# Evaluaciones máximas de la malla Normal (medias × desviaciones × bins); con muchos bins
+# la malla se reduce y el refinamiento posterior recupera la precisión
+NORMAL_GRID_BUDGET = 4_000_000
+# Elementos máximos por bloque al evaluar la malla Normal
+NORMAL_GRID_BLOCK = 2_000_000
+# Iteraciones máximas de Nelder-Mead al refinar la estimación Normal
+NORMAL_REFINE_MAXITER = 200
+
+
+def _poisson_log_probability_grid(lambdas, bins, num_bins):
+    from scipy.stats import poisson
+    # Log-probabilidad de los bins indicados para cada lambda (una fila por candidato),
+    # normalizada igual que en la prueba Chi-cuadrado: los bins suman P(X >= 1).
+    # En escala logarítmica no se anula aunque la probabilidad lineal se desborde a 0.
+    lambdas = np.asarray(lambdas, dtype=float)[:, None]
+    values = bins[None, :] + 1
+    with np.errstate(divide='ignore', invalid='ignore'):
+        log_probabilities = np.where(
+            values < num_bins, poisson.logpmf(values, lambdas), poisson.logsf(num_bins - 1, lambdas)
+        )
+        return log_probabilities - poisson.logsf(0, lambdas)
+
+
+def _normal_log_probability_grid(means, std_devs, bins, num_bins):
+    from scipy.special import log_ndtr
+    # Igual que normal_bin_probability_grid: el bin i cubre [i + 0.5, i + 1.5) y el último
+    # se extiende a infinito; el total normalizador es P(X >= 0.5)
+    means = np.asarray(means, dtype=float)[:, None]
+    std_devs = np.asarray(std_devs, dtype=float)[:, None]
+    last = bins[None, :] == num_bins - 1
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        lower = (bins[None, :] + 0.5 - means) / std_devs
+        upper = np.where(last, np.inf, (bins[None, :] + 1.5 - means) / std_devs)
+        # Diferencia de CDF en la cola donde no se pierde precisión: los intervalos por
+        # encima de la media se reflejan (P(a < X < b) = P(-b < X < -a))
+        right = lower + upper > 0
+        log_low = log_ndtr(np.where(right, -upper, lower))
+        log_high = log_ndtr(np.where(right, -lower, upper))
+        log_probabilities = log_high + np.log1p(-np.exp(log_low - log_high))
+        return log_probabilities - log_ndtr((means - 0.5) / std_devs)
+
+
+def _log_likelihood_grid(counts, log_probabilities):
+    from scipy.special import gammaln
+    # Log-verosimilitud multinomial agrupada de cada fila de `log_probabilities`, que solo
+    # trae los bins con conteo positivo (los vacíos no aportan nada)
+    log_likelihood = (counts * log_probabilities).sum(axis=-1)
+    log_likelihood = np.where(np.isnan(log_likelihood), -np.inf, log_likelihood)
+    return log_likelihood + gammaln(counts.sum() + 1) - gammaln(counts + 1).sum()
+
+
+def _observed_bins(counts):
+    bins = np.flatnonzero(counts)
+    return bins, counts[bins]
+
+
+def _poisson_log_likelihood(counts, lambda_val):
+    bins, observed = _observed_bins(counts)
+    return _log_likelihood_grid(observed, _poisson_log_probability_grid([lambda_val], bins, len(counts)))[0]
+
+
+def _normal_log_likelihood(counts, mean_val, std_dev_val):
+    bins, observed = _observed_bins(counts)
+    return _log_likelihood_grid(
+        observed, _normal_log_probability_grid([mean_val], [std_dev_val], bins, len(counts))
+    )[0]
+
+
+def method_of_moments(counts, distribution_type):
+    # El bin i corresponde al valor i + 1 (semestre)
+    values = np.arange(1, len(counts) + 1)
+    n = counts.sum()
+    mean_val = float(np.dot(counts, values) / n)
+    if distribution_type == 'poisson':
+        return {"lambda": mean_val}
+    variance = float(np.dot(counts, (values - mean_val) ** 2) / n)
+    return {"mean": mean_val, "stdDev": float(np.sqrt(variance))}
+
+
+def _fit_poisson(counts, moments):
+    from scipy.optimize import minimize_scalar
+    # Malla geométrica de lambdas (más la estimación por momentos) evaluada en una sola
+    # pasada; luego refinamiento acotado
+    bins, observed = _observed_bins(counts)
+    upper = max(4 * moments["lambda"], 2 * len(counts), 1.0)
+    grid = np.union1d(np.geomspace(1e-3, upper, POISSON_GRID_SIZE), [moments["lambda"]])
+    log_likelihood = _log_likelihood_grid(observed, _poisson_log_probability_grid(grid, bins, len(counts)))
+    best = int(np.argmax(log_likelihood))
+    if not np.isfinite(log_likelihood[best]):
+        return None
+    low, high = grid[max(best - 1, 0)], grid[min(best + 1, len(grid) - 1)]
+    refined = minimize_scalar(
+        lambda lambda_val: -_poisson_log_likelihood(counts, lambda_val),
+        bounds=(low, high), method='bounded', options={'xatol': 1e-8},
+    )
+    if refined.success and -refined.fun >= log_likelihood[best]:
+        return {"lambda": float(refined.x)}
+    return {"lambda": float(grid[best])}
+
+
+def _fit_normal(counts, moments):
+    from scipy.optimize import minimize
+    bins, observed = _observed_bins(counts)
+    std_dev_val = max(moments["stdDev"], 0.25)
+    grid_size = int(min(NORMAL_GRID_SIZE, max(8, np.sqrt(NORMAL_GRID_BUDGET / len(bins)))))
+    means = np.linspace(moments["mean"] - 4 * std_dev_val - 2, moments["mean"] + 4 * std_dev_val + 2, grid_size)
+    std_devs = np.geomspace(std_dev_val / 8, std_dev_val * 4, grid_size)
+
+    # Malla completa (media, desviación) evaluada por bloques de medias para acotar la memoria
+    log_likelihood = np.empty((len(means), len(std_devs)))
+    block = max(1, NORMAL_GRID_BLOCK // (len(std_devs) * len(bins)))
+    for start in range(0, len(means), block):
+        mean_block = means[start:start + block]
+        grid_means = np.repeat(mean_block, len(std_devs))
+        grid_std_devs = np.tile(std_devs, len(mean_block))
+        log_probabilities = _normal_log_probability_grid(grid_means, grid_std_devs, bins, len(counts))
+        log_likelihood[start:start + block] = _log_likelihood_grid(observed, log_probabilities).reshape(len(mean_block), -1)
+
+    best_mean, best_std = np.unravel_index(np.argmax(log_likelihood), log_likelihood.shape)
+    if not np.isfinite(log_likelihood[best_mean, best_std]):
+        return None
+    # Refinamiento sobre (media, log desviación) para mantener la desviación positiva. La malla
+    # ya deja el punto de partida cerca del óptimo: basta una tolerancia moderada y un tope de
+    # iteraciones para que histogramas con muchos bins no tarden minutos
+    refined = minimize(
+        lambda theta: -_normal_log_likelihood(counts, theta[0], np.exp(theta[1])),
+        x0=[means[best_mean], np.log(std_devs[best_std])], method='Nelder-Mead',
+        options={'xatol': 1e-6, 'fatol': 1e-6, 'maxiter': NORMAL_REFINE_MAXITER},
+    )
+    if np.isfinite(refined.fun) and -refined.fun >= log_likelihood[best_mean, best_std]:
+        return {"mean": float(refined.x[0]), "stdDev": float(np.exp(refined.x[1]))}
+    return {"mean": float(means[best_mean]), "stdDev": float(std_devs[best_std])}
+
+
+def _finite_or_none(value):
+    # JSON no admite Infinity/NaN: una verosimilitud nula se informa como null
+    return float(value) if np.isfinite(value) else None
+
+
+def _summary(counts, distribution_type, parameters):
+    if distribution_type == 'poisson':
+        log_likelihood = _poisson_log_likelihood(counts, parameters["lambda"])
+    else:
+        log_likelihood = _normal_log_likelihood(counts, parameters["mean"], parameters["stdDev"])
+    k = NUM_PARAMETERS[distribution_type]
+    n = counts.sum()
+    return {
+        "parameters": parameters,
+        "logLikelihood": _finite_or_none(log_likelihood),
+        "aic": _finite_or_none(2 * k - 2 * log_likelihood),
+        "bic": _finite_or_none(k * np.log(n) - 2 * log_likelihood),
+    }
+
+
+@timed('fit')
+def fit_distribution(observed_data, distribution_type):
+    """Estima los parámetros por máxima verosimilitud agrupada y por el método de los momentos.
+
+    Devuelve un diccionario con ambas estimaciones, cada una con su log-verosimilitud, AIC y BIC.
+    Lanza ValueError con el mensaje para el usuario si los datos no permiten el ajuste.
+    """
+    if distribution_type not in NUM_PARAMETERS:
+        raise ValueError("Tipo de distribución no soportado para el ajuste.")
+    try:
+        counts = np.asarray(observed_data, dtype=float)
+    except (TypeError, ValueError):
+        raise ValueError("observedData debe ser una lista de conteos no negativos.") from None
+    if counts.ndim != 1 or len(counts) == 0 or not np.all(np.isfinite(counts)) or np.any(counts < 0):
+        raise ValueError("observedData debe ser una lista de conteos no negativos.")
+    if len(counts) <= NUM_PARAMETERS[distribution_type]:
+        raise ValueError(
+            f"Se necesitan al menos {NUM_PARAMETERS[distribution_type] + 1} bins en observedData para ajustar esta distribución."
+        )
+    if counts.sum() == 0:
+        raise ValueError("No hay abandonos observados para analizar (suma total es 0).")
+
+    moments = method_of_moments(counts, distribution_type)
+    if distribution_type == 'poisson':
+        mle = _fit_poisson(counts, moments)
+    else:
+        mle = _fit_normal(counts, moments)
+    if mle is None:
+        raise ValueError("Los datos observados no son compatibles con la distribución elegida: "
+                         "la verosimilitud es nula para todos los parámetros candidatos.")
+    return {
+        "distributionType": distribution_type,
+        "observedTotal": float(counts.sum()),
+        "mle": _summary(counts, distribution_type, mle),
+        "methodOfMoments": _summary(counts, distribution_type, moments),
+    }
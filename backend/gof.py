@@ -0,0 +1,312 @@
+import numpy as np
+
+from binning import DEFAULT_MIN_EXPECTED, group_categories_batch
+from cache import memoize
+from distributions import (
+    poisson_bin_probabilities, normal_bin_probabilities,
+    poisson_bin_probability_grid, normal_bin_probability_grid,
+)
+from metrics import stage, timed
+
+# Nivel de significancia usado en las conclusiones
+ALPHA = 0.05
+# Máximo de combinaciones (datasets × parámetros × pruebas) por petición por lotes
+MAX_BATCH_CASES = 100_000
+# Máximo de elementos (bins de cada dataset × conjuntos de parámetros) de las matrices
+# apiladas de un lote: acota la memoria aunque haya pocos casos con muchos bins
+MAX_BATCH_ELEMENTS = 10_000_000
+# Tamaño de muestra máximo para el p-valor K-S discreto exacto (Poisson); su costo crece con
+# n, así que por encima se usa el límite asintótico, cuyo costo no depende de n
+KS_DISCRETE_EXACT_MAX_N = 20_000
+# Paso de la malla del puente browniano en el p-valor asintótico discreto
+KS_ASYMPTOTIC_GRID_STEP = 0.005
+# Por debajo de este producto de longitudes la convolución directa es más rápida que la FFT
+DIRECT_CONVOLVE_MAX = 300_000
+# Puntos máximos del soporte de la Poisson para los p-valores discretos (exacto y asintótico),
+# que recorren el soporte punto a punto. Por encima (lambda > ~9e4) ningún salto de la CDF
+# supera ~1.3e-3 y se usa la distribución de D para una nula continua
+KS_DISCRETE_MAX_SUPPORT = 5_000
+# Soporte máximo (en enteros) de la Normal redondeada que se simula en el Monte Carlo K-S;
+# con desviaciones mayores el redondeo es despreciable y se simula la nula continua
+KS_ROUNDED_MAX_SUPPORT = 100_000
+
+
+@timed('expected')
+def bin_probabilities(distribution_type, lambda_val, mean_val, std_dev_val, num_bins):
+    # Probabilidad teórica para cada "bin" (semestre); se memoriza por parámetros y número de bins.
+    # Los errores de parámetros se lanzan como ValueError con el mensaje para el usuario.
+    if distribution_type == 'poisson':
+        if lambda_val is None:
+            raise ValueError("Lambda para Poisson no proporcionado.")
+        (probabilities,) = poisson_bin_probabilities(float(lambda_val), num_bins)
+    elif distribution_type == 'normal':
+        if mean_val is None or std_dev_val is None:
+            raise ValueError("Media o Desviación Estándar para Normal no proporcionados.")
+        (probabilities,) = normal_bin_probabilities(float(mean_val), float(std_dev_val), num_bins)
+    else:
+        raise ValueError("Tipo de distribución no soportado para la prueba.")
+    return probabilities
+
+
+def _parameter_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        raise ValueError("Parámetros de distribución no numéricos.") from None
+
+
+def parse_parameter_set(parameters):
+    # Valida y convierte un conjunto de parámetros del lote: devuelve
+    # (distribución, lambda, media, desviación) con None en los que no aplican.
+    # Los errores se lanzan como ValueError con los mismos mensajes que bin_probabilities.
+    distribution_type = parameters.get('distributionType')
+    if distribution_type == 'poisson':
+        if parameters.get('lambda') is None:
+            raise ValueError("Lambda para Poisson no proporcionado.")
+        return distribution_type, _parameter_float(parameters['lambda']), None, None
+    if distribution_type == 'normal':
+        if parameters.get('mean') is None or parameters.get('stdDev') is None:
+            raise ValueError("Media o Desviación Estándar para Normal no proporcionados.")
+        return distribution_type, None, _parameter_float(parameters['mean']), _parameter_float(parameters['stdDev'])
+    raise ValueError("Tipo de distribución no soportado para la prueba.")
+
+
+@timed('expected')
+def bin_probability_matrix(parsed_sets, num_bins):
+    # Probabilidades por bin de muchos conjuntos ya validados (salida de parse_parameter_set),
+    # una fila por conjunto: se agrupan por distribución y cada grupo se evalúa con una sola
+    # llamada a la malla. Los conjuntos None (inválidos) quedan como filas NaN.
+    probabilities = np.full((len(parsed_sets), num_bins), np.nan)
+    poisson_rows = [row for row, parsed in enumerate(parsed_sets) if parsed and parsed[0] == 'poisson']
+    normal_rows = [row for row, parsed in enumerate(parsed_sets) if parsed and parsed[0] == 'normal']
+    if poisson_rows:
+        probabilities[poisson_rows] = poisson_bin_probability_grid(
+            [parsed_sets[row][1] for row in poisson_rows], num_bins
+        )
+    if normal_rows:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            probabilities[normal_rows] = normal_bin_probability_grid(
+                [parsed_sets[row][2] for row in normal_rows], [parsed_sets[row][3] for row in normal_rows], num_bins
+            )
+    return probabilities
+
+
+def conclusion(p_value, distribution_type, alpha=ALPHA):
+    if p_value < alpha:
+        return f"Se rechaza la hipótesis nula (H0). Los datos observados NO se ajustan a una distribución {distribution_type.capitalize()} con los parámetros dados (p-valor = {p_value:.4f} < {alpha})."
+    return f"No se rechaza la hipótesis nula (H0). Los datos observados PUEDEN ajustarse a una distribución {distribution_type.capitalize()} con los parámetros dados (p-valor = {p_value:.4f} >= {alpha})."
+
+
+def chi_square_batch(observed, expected, min_expected=DEFAULT_MIN_EXPECTED, ddof=0, strategy='forward'):
+    """Chi-cuadrado para muchas filas a la vez.
+
+    `observed` y `expected` son matrices (filas × bins) con las frecuencias esperadas ya
+    escaladas al total de cada fila. La agrupación, el estadístico, los grados de libertad
+    y el p-valor se calculan sobre matrices rellenadas con ceros (ver binning.py).
+    Las filas cuya suma no cuadra después de agrupar devuelven estadístico NaN.
+    `ddof` resta un grado de libertad por cada parámetro estimado a partir de los datos.
+    """
+    from scipy.stats import chi2
+    grouped_observed, grouped_expected, n_groups = group_categories_batch(observed, expected, min_expected, strategy)
+    with stage('chi_square'):
+        valid = np.arange(grouped_observed.shape[1])[None, :] < n_groups[:, None]
+        # Evitar división por cero con un valor muy pequeño, igual que en la prueba individual
+        grouped_expected = np.where(valid, np.maximum(grouped_expected, 1e-10), 1.0)
+
+        sums_agree = np.isclose(
+            np.where(valid, grouped_observed, 0).sum(axis=1),
+            np.where(valid, grouped_expected, 0).sum(axis=1),
+        )
+        statistics = np.where(valid, (grouped_observed - grouped_expected) ** 2 / grouped_expected, 0).sum(axis=1)
+        statistics[~sums_agree] = np.nan
+        degrees_of_freedom = n_groups - 1 - ddof
+        with np.errstate(invalid='ignore'):
+            p_values = chi2.sf(statistics, np.where(degrees_of_freedom > 0, degrees_of_freedom, np.nan))
+    grouped = [
+        (grouped_observed[row, :n_groups[row]], grouped_expected[row, :n_groups[row]])
+        for row in range(len(n_groups))
+    ]
+    return statistics, p_values, degrees_of_freedom, grouped
+
+
+def ks_statistic(counts, cdf_values):
+    """Estadístico K-S a partir de pares (valor, conteo) ya ordenados por valor.
+
+    Equivale a `kstest` sobre la muestra expandida: dentro de un grupo de empates el
+    máximo de D+ está en el último elemento y el de D- en el primero, así que basta
+    evaluar una vez por bin. El coste depende del número de bins, no del total.
+    """
+    n = counts.sum()
+    cumulative = np.cumsum(counts)
+    d_plus = np.max(cumulative / n - cdf_values)
+    d_minus = np.max(cdf_values - (cumulative - counts) / n)
+    return max(d_plus, d_minus)
+
+
+def _poisson_support_bounds(lambda_val):
+    from scipy.stats import poisson
+    # Soporte K0..K1 con masa despreciable (1e-16) fuera; crece con sqrt(lambda), no con lambda
+    return max(int(poisson.ppf(1e-16, lambda_val)) - 1, 0), int(poisson.isf(1e-16, lambda_val)) + 1
+
+
+def poisson_support_size(lambda_val):
+    first, last = _poisson_support_bounds(lambda_val)
+    return last - first + 1
+
+
+@memoize
+def _poisson_support_cdf(lambda_val):
+    from scipy.stats import poisson
+    # CDF de la Poisson en k = K0..K1, con las colas agrupadas en los extremos: P(X <= K0) en
+    # K0 y P(X >= K1) en K1 (CDF final = 1)
+    first, last = _poisson_support_bounds(lambda_val)
+    cdf_values = poisson.cdf(np.arange(first, last + 1), lambda_val)
+    cdf_values[-1] = 1.0
+    return (cdf_values,)
+
+
+def poisson_support_cdf(lambda_val):
+    return _poisson_support_cdf(lambda_val)[0]
+
+
+def ks_monte_carlo_setup(distribution_type, lambda_val, n, mean_val=None, std_dev_val=None):
+    from scipy.stats import norm
+    # Datos que necesitan los workers de montecarlo.py para simular el estadístico K-S
+    if distribution_type == 'poisson':
+        if poisson_support_size(lambda_val) <= KS_DISCRETE_MAX_SUPPORT:
+            return 'ks_discrete', {"cdf": poisson_support_cdf(lambda_val), "n": n}
+        return 'ks_continuous', {"n": n}
+    if not std_dev_val > 0:
+        return 'ks_continuous', {"n": n}
+    # Los datos observados son semestres enteros: bajo la nula se simulan normales redondeadas
+    # al entero más cercano (colas agrupadas en los extremos) y el estadístico se evalúa con
+    # la CDF continua en esos enteros, igual que ks_test sobre el histograma observado
+    low = int(np.floor(norm.ppf(1e-16, mean_val, std_dev_val)))
+    high = int(np.ceil(norm.isf(1e-16, mean_val, std_dev_val)))
+    if high - low + 1 > KS_ROUNDED_MAX_SUPPORT:
+        return 'ks_continuous', {"n": n}
+    support = np.arange(low, high + 1)
+    probabilities = np.diff(norm.cdf(support[1:] - 0.5, mean_val, std_dev_val), prepend=0.0, append=1.0)
+    return 'ks_rounded', {"probabilities": probabilities, "cdf": norm.cdf(support, mean_val, std_dev_val), "n": n}
+
+
+def poisson_ks_pvalue(statistic, n, lambda_val):
+    """P(D >= statistic) exacto bajo una Poisson discreta con n observaciones.
+
+    El estadístico de `kstest` sobre datos enteros cumple D < d si y solo si, para todo
+    k >= 0, n (F(k+1) - d) < N(k) < n (F(k) + d), con N(k) el número de observaciones <= k
+    (y además F(0) < d). La probabilidad de que la multinomial respete esas bandas se
+    calcula "poissonizando": los conteos por k son Poisson(n p_k) independientes
+    condicionados a sumar n, y la suma acumulada se propaga con convoluciones (FFT)
+    restringidas a la banda permitida.
+    """
+    from scipy.signal import fftconvolve
+    from scipy.special import gammaln, xlogy
+    # Desplazamiento mínimo para que el caso observado (D == d) cuente como D >= d
+    d = statistic - 1e-7 / n
+    cdf_values = poisson_support_cdf(lambda_val)
+    if cdf_values[0] >= d:
+        return 1.0
+    # Para el último k (la cola agrupada) las bandas se cumplen siempre
+    point_probabilities = np.diff(cdf_values, prepend=0.0)
+
+    offset = 0
+    state = np.ones(1)  # distribución de N(k-1), empezando por N(-1) = 0
+    for k, mean in enumerate(n * point_probabilities):
+        # Ventana de la Poisson(mean) con masa despreciable fuera de ±12 desviaciones
+        spread = 12 * np.sqrt(mean) + 10
+        low = max(0, int(mean - spread))
+        high = min(n, int(np.ceil(mean + spread)))
+        support = np.arange(low, high + 1)
+        window = np.exp(xlogy(support, mean) - mean - gammaln(support + 1))
+        if len(state) * len(window) <= DIRECT_CONVOLVE_MAX:
+            state = np.convolve(state, window)
+        else:
+            state = np.clip(fftconvolve(state, window), 0.0, None)
+        offset += low
+
+        upper = n * (cdf_values[k] + d)
+        lower = n * (cdf_values[k + 1] - d) if k + 1 < len(cdf_values) else -1.0
+        band_low = max(int(np.floor(lower)) + 1, offset, 0)
+        band_high = min(int(np.ceil(upper)) - 1, offset + len(state) - 1, n)
+        if band_high < band_low:
+            return 1.0
+        state = state[band_low - offset:band_high - offset + 1]
+        offset = band_low
+
+    if offset + len(state) - 1 < n:
+        return 1.0
+    probability_inside = state[n - offset] / np.exp(xlogy(n, n) - n - gammaln(n + 1))
+    return float(np.clip(1.0 - probability_inside, 0.0, 1.0))
+
+
+def poisson_ks_pvalue_asymptotic(statistic, n, lambda_val):
+    """P(D >= statistic) bajo una Poisson discreta en el límite de n grande.
+
+    Mismas bandas que poisson_ks_pvalue, escritas para W(k) = (N(k) - n F(k)) / sqrt(n):
+    sqrt(n) (p(k+1) - d) < W(k) < sqrt(n) d. Al crecer n, W es un puente browniano
+    observado en los puntos F(k), es decir, una caminata gaussiana con incrementos de
+    varianza p(k) condicionada a terminar en 0. Su densidad se propaga sobre una malla fija,
+    así que el costo depende del soporte de la Poisson y no de n.
+    """
+    from scipy.signal import fftconvolve
+    d = statistic
+    cdf_values = poisson_support_cdf(lambda_val)
+    if cdf_values[0] >= d:
+        return 1.0
+    point_probabilities = np.diff(cdf_values, prepend=0.0)
+
+    step = KS_ASYMPTOTIC_GRID_STEP
+    # La varianza de W(k) es F(k) <= 1: fuera de ±8.5 no queda masa apreciable
+    grid = np.arange(-round(8.5 / step), round(8.5 / step) + 1) * step
+    zero = len(grid) // 2
+    state = np.zeros(len(grid))
+    state[zero] = 1.0
+    root_n = np.sqrt(n)
+    # Los incrementos gaussianos se acumulan mientras las bandas no recorten la malla y se
+    # aplican en una sola convolución (la suma de normales independientes es normal)
+    pending_variance = 0.0
+    for k, variance in enumerate(point_probabilities):
+        pending_variance += variance
+        upper = root_n * d
+        lower = root_n * (point_probabilities[k + 1] - d) if k + 1 < len(cdf_values) else -np.inf
+        if k + 1 < len(cdf_values) and lower < grid[0] and upper > grid[-1]:
+            continue
+        half_width = int(np.ceil(8 * np.sqrt(pending_variance) / step))
+        if half_width > 0:
+            kernel = np.exp(-0.5 * (np.arange(-half_width, half_width + 1) * step) ** 2 / pending_variance)
+            state = np.clip(fftconvolve(state, kernel / kernel.sum(), mode='same'), 0.0, None)
+        pending_variance = 0.0
+        state[(grid <= lower) | (grid >= upper)] = 0.0
+
+    # Densidad de W al final en 0 frente a la de la caminata sin bandas (normal estándar)
+    probability_inside = state[zero] / step * np.sqrt(2 * np.pi)
+    return float(np.clip(1.0 - probability_inside, 0.0, 1.0))
+
+
+@timed('ks')
+def ks_test(observed_data, distribution_type, lambda_val, mean_val, std_dev_val):
+    from scipy.stats import kstwo, norm, poisson
+    # K-S ponderado: el bin i (semestre i + 1) aporta el valor i + 1 con peso igual a su conteo,
+    # sin expandir la muestra sintética.
+    counts = np.asarray(observed_data)
+    values = np.arange(1, len(counts) + 1)
+    occupied = counts > 0
+    counts, values = counts[occupied], values[occupied]
+
+    if len(counts) == 0:
+        raise ValueError("No hay datos en la muestra observada para la prueba K-S.")
+
+    n = int(counts.sum())
+    if distribution_type == 'poisson':
+        stat = ks_statistic(counts, poisson.cdf(values, lambda_val))
+        # Para la Poisson la distribución nula de D es discreta: p-valor exacto si es viable
+        if poisson_support_size(lambda_val) <= KS_DISCRETE_MAX_SUPPORT:
+            if n <= KS_DISCRETE_EXACT_MAX_N:
+                return stat, poisson_ks_pvalue(stat, n, lambda_val), n, 'exact_discrete'
+            return stat, poisson_ks_pvalue_asymptotic(stat, n, lambda_val), n, 'asymptotic_discrete'
+        return stat, float(np.clip(kstwo.sf(stat, n), 0.0, 1.0)), n, 'continuous_approximation'
+    else:
+        stat = ks_statistic(counts, norm.cdf(values, loc=mean_val, scale=std_dev_val))
+    # Misma aproximación que kstest (distribución de D para una nula continua)
+    return stat, float(np.clip(kstwo.sf(stat, n), 0.0, 1.0)), n, 'exact_continuous'
@@ -0,0 +1,61 @@
+import multiprocessing
+import os
+import tempfile
+
+# Configuración de producción: `gunicorn -c gunicorn.conf.py wsgi:app` (ver Procfile)
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
+workers = int(os.environ.get("WEB_CONCURRENCY", min(4, multiprocessing.cpu_count())))
+# Hilos por worker: mientras un hilo espera al pool de análisis, los demás atienden
+# /api/hello, los estáticos y las curvas en caché
+worker_class = "gthread"
+threads = int(os.environ.get("GUNICORN_THREADS", 4))
+# Importar la app (y precalcular tablas en wsgi.py) antes del fork
+preload_app = True
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 180))
+graceful_timeout = 30
+keepalive = 5
+# Reciclar workers de vez en cuando acota la memoria de las cachés por proceso
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", 2000))
+max_requests_jitter = max_requests // 10
+
+# Los datasets viven en memoria de cada proceso: con varios workers deben persistirse en un
+# directorio común o una petición que caiga en otro worker respondería 404
+os.environ.setdefault("DATASETS_DIR", os.path.join(tempfile.gettempdir(), "modelado-datasets"))
+
+# Cada worker tiene su propio registro de métricas: se vuelcan a este directorio y
+# /api/metrics suma los de todos (ver metrics.py)
+os.environ.setdefault("METRICS_DIR", os.path.join(tempfile.gettempdir(), "modelado-metrics"))
+
+# Pruebas costosas en procesos aparte (serving.run_analysis); 0 las ejecuta en el hilo del worker
+os.environ.setdefault("OFFLOAD_WORKERS", "2")
+
+
+def on_starting(server):
+    # Los volcados de métricas de una ejecución anterior no deben sumarse a esta
+    import metrics
+    metrics.reset_directory()
+
+
+def post_fork(server, worker):
+    # Crear el pool en cada worker, no en el maestro: los pools no sobreviven a un fork
+    import metrics
+    from serving import get_executor, offload_workers
+    # Lo medido en el maestro (precálculo de wsgi.py) no se cuenta una vez por worker
+    metrics.reset_process()
+    if offload_workers() > 0:
+        get_executor()
+
+
+def worker_exit(server, worker):
+    import metrics
+    from serving import shutdown
+    shutdown()
+    metrics.flush()
+
+
+def child_exit(server, worker):
+    # En el maestro, también si el worker murió por timeout: sus métricas pasan al archivo
+    # acumulado para que los totales no retrocedan
+    import metrics
+    metrics.archive_process(worker.pid)
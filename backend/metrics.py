@@ -0,0 +1,454 @@
+import bisect
+import contextlib
+import contextvars
+import cProfile
+import functools
+import io
+import json
+import os
+import pstats
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin bloqueo entre procesos
+    fcntl = None
+
+# Métricas del proceso en formato de texto de Prometheus (GET /api/metrics):
+#   - peticiones por ruta, método y código; latencia por ruta (histograma)
+#   - tiempo por etapa (parse_json, expected, grouping, chi_square, ks, fit, serialize, ...)
+#   - tamaño de los cuerpos de petición y respuesta
+# Cada proceso tiene su propio registro. Con METRICS_DIR (gunicorn.conf.py lo define) cada
+# worker de gunicorn vuelca el suyo a METRICS_DIR/<pid>.json cada METRICS_FLUSH_INTERVAL
+# segundos y /api/metrics suma los de todos los workers más los ya terminados (archive.json),
+# así que cualquier worker responde con los mismos totales y los contadores no retroceden al
+# reciclarse un worker. Sin METRICS_DIR (servidor de desarrollo, un solo proceso) la consulta
+# devuelve el registro del proceso, con su pid en http_process_info.
+#
+# Con METRICS_ENABLED=0 no se registra ningún hook y stage()/timed() solo comprueban un booleano.
+# El perfilado por petición (cabecera X-Profile) requiere PROFILING_ENABLED=1.
+
+ENABLED = os.environ.get("METRICS_ENABLED", "1") != "0"
+PROFILING_ENABLED = os.environ.get("PROFILING_ENABLED", "0") == "1"
+PROFILE_HEADER = "X-Profile"
+# Funciones mostradas en el resumen de cProfile
+PROFILE_TOP = int(os.environ.get("PROFILE_TOP", 25))
+METRICS_DIR = os.environ.get("METRICS_DIR")
+METRICS_FLUSH_INTERVAL = float(os.environ.get("METRICS_FLUSH_INTERVAL", 1.0))
+# Registros sumados de los workers que ya terminaron
+ARCHIVE_FILE = "archive.json"
+LOCK_FILE = "metrics.lock"
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+STAGE_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216, 67108864)
+
+# Etapas de la petición en curso: [(nombre, segundos)], o None fuera de una petición
+_request_stages = contextvars.ContextVar("request_stages", default=None)
+_current_profile = contextvars.ContextVar("current_profile", default=None)
+# cProfile no admite dos perfiladores activos a la vez en el mismo proceso
+_profile_lock = threading.Lock()
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs.extend(f'{name}="{value}"' for name, value in extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_number(value):
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Counter:
+    def __init__(self, name, documentation, label_names=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels=(), amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def empty_copy(self):
+        return Counter(self.name, self.documentation, self.label_names)
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+    def dump(self):
+        # Estado serializable en JSON, para sumarlo entre procesos con merge()
+        with self._lock:
+            return [[list(labels), value] for labels, value in self._values.items()]
+
+    def merge(self, items):
+        for labels, value in items:
+            self.inc(tuple(labels), value)
+
+    def expose(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, value in items:
+            lines.append(f"{self.name}{_format_labels(self.label_names, labels)} {_format_number(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, documentation, label_names=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self.buckets = tuple(buckets)
+        # labels -> [conteos por bucket (no acumulados) + desbordamiento, suma]
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, labels=()):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def empty_copy(self):
+        return Histogram(self.name, self.documentation, self.label_names, self.buckets)
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+    def dump(self):
+        with self._lock:
+            return [[list(labels), list(series[0]), series[1]] for labels, series in self._series.items()]
+
+    def merge(self, items):
+        with self._lock:
+            for labels, counts, total in items:
+                series = self._series.setdefault(tuple(labels), [[0] * (len(self.buckets) + 1), 0.0])
+                series[0] = [current + count for current, count in zip(series[0], counts)]
+                series[1] += total
+
+    def snapshot(self, labels=()):
+        # (conteo, suma) de una serie; útil para los benchmarks
+        with self._lock:
+            series = self._series.get(labels)
+            return (sum(series[0]), series[1]) if series else (0, 0.0)
+
+    def expose(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((labels, (list(series[0]), series[1])) for labels, series in self._series.items())
+        for labels, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else _format_number(bound)
+                lines.append(f"{self.name}_bucket{_format_labels(self.label_names, labels, [('le', le)])} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.label_names, labels)} {total!r}")
+            lines.append(f"{self.name}_count{_format_labels(self.label_names, labels)} {cumulative}")
+        return lines
+
+
+requests_total = Counter("http_requests_total", "Peticiones atendidas.", ("endpoint", "method", "status"))
+request_duration = Histogram(
+    "http_request_duration_seconds", "Latencia de las peticiones.", ("endpoint", "method")
+)
+stage_duration = Histogram(
+    "http_stage_duration_seconds", "Tiempo por etapa del cálculo.", ("stage",), STAGE_BUCKETS
+)
+request_size = Histogram("http_request_size_bytes", "Tamaño del cuerpo de la petición.", ("endpoint",), SIZE_BUCKETS)
+response_size = Histogram("http_response_size_bytes", "Tamaño del cuerpo de la respuesta.", ("endpoint",), SIZE_BUCKETS)
+REGISTRY = (requests_total, request_duration, stage_duration, request_size, response_size)
+
+
+def record_stage(name, seconds):
+    stage_duration.observe(seconds, (name,))
+    stages = _request_stages.get()
+    if stages is not None:
+        stages.append((name, seconds))
+
+
+class stage:
+    """Cronometra un bloque: `with stage('grouping'): ...`."""
+
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        if ENABLED:
+            self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        if ENABLED:
+            record_stage(self.name, time.perf_counter() - self.start)
+        return False
+
+
+def timed(name):
+    """Decorador equivalente a envolver todo el cuerpo de la función en stage(name)."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                record_stage(name, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+def run_collecting_stages(func, data):
+    # Para el pool de serving.py: ejecuta func(data) en el proceso hijo y devuelve también
+    # sus etapas, que el proceso web registra con record_stage
+    token = _request_stages.set([])
+    try:
+        return func(data), _request_stages.get()
+    finally:
+        _request_stages.reset(token)
+
+
+def profiling_active():
+    # Con el perfilador activo el cálculo no se delega al pool: cProfile solo ve este hilo
+    return _current_profile.get() is not None
+
+
+def _profile_summary(profiler):
+    output = io.StringIO()
+    stats = pstats.Stats(profiler, stream=output)
+    stats.strip_dirs().sort_stats("cumulative").print_stats(PROFILE_TOP)
+    return output.getvalue()
+
+
+def _snapshot_path(pid):
+    return os.path.join(METRICS_DIR, f"{pid}.json")
+
+
+@contextlib.contextmanager
+def _directory_lock(exclusive):
+    # Bloqueo del directorio: exclusivo al archivar un worker, compartido al leer los volcados
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    with open(os.path.join(METRICS_DIR, LOCK_FILE), "a") as handle:
+        if fcntl is not None:
+            fcntl.flock(handle, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        yield
+
+
+def _write_json(path, data):
+    # Escritura atómica: quien lee ve el volcado anterior o el nuevo, nunca uno a medias
+    temporary_path = f"{path}.{os.getpid()}.tmp"
+    with open(temporary_path, "w") as handle:
+        json.dump(data, handle)
+    os.replace(temporary_path, path)
+
+
+def _read_json(path):
+    with open(path) as handle:
+        return json.load(handle)
+
+
+def _aggregate(snapshots):
+    registry = tuple(metric.empty_copy() for metric in REGISTRY)
+    for snapshot in snapshots:
+        for metric in registry:
+            metric.merge(snapshot.get(metric.name, []))
+    return registry
+
+
+def flush():
+    """Vuelca el registro de este proceso a METRICS_DIR/<pid>.json (sin METRICS_DIR no hace nada)."""
+    if not METRICS_DIR:
+        return
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    _write_json(_snapshot_path(os.getpid()), {metric.name: metric.dump() for metric in REGISTRY})
+
+
+def archive_process(pid):
+    """Suma el volcado de un worker terminado a archive.json (hook child_exit del maestro)."""
+    if not METRICS_DIR:
+        return
+    with _directory_lock(exclusive=True):
+        try:
+            snapshot = _read_json(_snapshot_path(pid))
+        except FileNotFoundError:
+            return
+        archive_path = os.path.join(METRICS_DIR, ARCHIVE_FILE)
+        snapshots = [snapshot]
+        if os.path.exists(archive_path):
+            snapshots.append(_read_json(archive_path))
+        _write_json(archive_path, {metric.name: metric.dump() for metric in _aggregate(snapshots)})
+        os.remove(_snapshot_path(pid))
+
+
+def reset_directory():
+    """Borra los volcados de una ejecución anterior (hook on_starting del maestro)."""
+    if not METRICS_DIR or not os.path.isdir(METRICS_DIR):
+        return
+    for name in os.listdir(METRICS_DIR):
+        if name.endswith(".json"):
+            os.remove(os.path.join(METRICS_DIR, name))
+
+
+def reset_process():
+    """Vacía el registro heredado del maestro (hook post_fork): si no, cada worker lo sumaría de nuevo."""
+    for metric in REGISTRY:
+        metric.clear()
+
+
+_flusher_pid = None
+_flusher_lock = threading.Lock()
+_flushed_requests = [0, 0]  # [peticiones atendidas, peticiones en el último volcado]
+
+
+def _start_flusher():
+    # Hilo de volcado periódico, uno por proceso (los hilos no sobreviven al fork)
+    global _flusher_pid
+    if not METRICS_DIR or _flusher_pid == os.getpid():
+        return
+    with _flusher_lock:
+        if _flusher_pid == os.getpid():
+            return
+        _flusher_pid = os.getpid()
+        threading.Thread(target=_flush_periodically, name="metrics-flush", daemon=True).start()
+
+
+def _flush_periodically():
+    while True:
+        time.sleep(METRICS_FLUSH_INTERVAL)
+        handled = _flushed_requests[0]
+        if handled != _flushed_requests[1]:
+            try:
+                flush()
+                _flushed_requests[1] = handled
+            except OSError:
+                pass
+
+
+def expose():
+    lines = []
+    if METRICS_DIR:
+        flush()
+        with _directory_lock(exclusive=False):
+            names = [name for name in os.listdir(METRICS_DIR) if name.endswith(".json")]
+            snapshots = []
+            for name in names:
+                try:
+                    snapshots.append(_read_json(os.path.join(METRICS_DIR, name)))
+                except FileNotFoundError:
+                    pass
+        for metric in _aggregate(snapshots):
+            lines.extend(metric.expose())
+        lines.append("# HELP http_metrics_workers Workers cuyos registros suma esta consulta.")
+        lines.append("# TYPE http_metrics_workers gauge")
+        lines.append(f"http_metrics_workers {sum(name != ARCHIVE_FILE for name in names)}")
+        return "\n".join(lines) + "\n"
+    for metric in REGISTRY:
+        lines.extend(metric.expose())
+    lines.append("# HELP http_process_info Proceso que atiende esta consulta de métricas.")
+    lines.append("# TYPE http_process_info gauge")
+    lines.append(f'http_process_info{{pid="{os.getpid()}"}} 1')
+    return "\n".join(lines) + "\n"
+
+
+def install(app):
+    """Registra los hooks de medición y la ruta /api/metrics en la app Flask."""
+    from flask import Response, g, request
+    from flask.json.provider import DefaultJSONProvider
+
+    @app.route('/api/metrics')
+    def get_metrics():
+        return Response(expose(), mimetype="text/plain; version=0.0.4")
+
+    if not ENABLED:
+        return
+
+    class TimedJSONProvider(DefaultJSONProvider):
+        # jsonify y request.get_json() pasan por aquí: la serialización de las respuestas y
+        # el parseo del cuerpo se miden como etapas cuando la vista los usa, sin leer antes
+        # el cuerpo (la ingesta de /api/datasets/<id>/records lo consume como flujo)
+        def response(self, *args, **kwargs):
+            with stage("serialize"):
+                return super().response(*args, **kwargs)
+
+        def loads(self, *args, **kwargs):
+            with stage("parse_json"):
+                return super().loads(*args, **kwargs)
+
+    app.json = TimedJSONProvider(app)
+
+    @app.before_request
+    def start_request_metrics():
+        g.metrics_start = time.perf_counter()
+        g.metrics_stages_token = _request_stages.set([])
+        if PROFILING_ENABLED and request.headers.get(PROFILE_HEADER) and _profile_lock.acquire(blocking=False):
+            profiler = cProfile.Profile()
+            g.metrics_profile_token = _current_profile.set(profiler)
+            profiler.enable()
+
+    @app.after_request
+    def finish_request_metrics(response):
+        start = g.pop("metrics_start", None)
+        if start is None:
+            return response
+        profiler = _current_profile.get()
+        if profiler is not None:
+            profiler.disable()
+            _current_profile.reset(g.pop("metrics_profile_token"))
+            _profile_lock.release()
+        elapsed = time.perf_counter() - start
+        stages = _request_stages.get() or []
+        _request_stages.reset(g.pop("metrics_stages_token"))
+
+        endpoint = request.url_rule.rule if request.url_rule is not None else "unmatched"
+        requests_total.inc((endpoint, request.method, str(response.status_code)))
+        request_duration.observe(elapsed, (endpoint, request.method))
+        request_size.observe(request.content_length or 0, (endpoint,))
+        if profiler is not None:
+            attach_profile(response, profiler, stages, elapsed)
+        response_size.observe(response.content_length or 0, (endpoint,))
+        _flushed_requests[0] += 1
+        _start_flusher()
+        return response
+
+    @app.teardown_request
+    def release_profiler(exc):
+        # Si la vista lanzó una excepción after_request no se ejecuta: liberar el perfilador
+        profiler = _current_profile.get()
+        if profiler is not None:
+            profiler.disable()
+            _current_profile.set(None)
+            _profile_lock.release()
+
+
+def attach_profile(response, profiler, stages, elapsed):
+    # Etapas en Server-Timing (visibles en las herramientas del navegador) y el resumen de
+    # cProfile bajo la clave "_profile" de la respuesta JSON
+    response.headers["Server-Timing"] = ", ".join(
+        [f"{name};dur={seconds * 1000:.3f}" for name, seconds in stages] + [f"total;dur={elapsed * 1000:.3f}"]
+    )
+    body = response.get_json(silent=True) if response.is_json else None
+    if not isinstance(body, dict):
+        response.headers["X-Profile-Status"] = "summary only available for JSON object responses"
+        return
+    body["_profile"] = {
+        "wallMs": round(elapsed * 1000, 3),
+        "stages": [{"stage": name, "ms": round(seconds * 1000, 3)} for name, seconds in stages],
+        "cProfile": _profile_summary(profiler),
+    }
+    response.set_data(json.dumps(body))
@@ -0,0 +1,199 @@
+import math
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+
+import numpy as np
+
+from metrics import timed
+
+# Este módulo solo depende de NumPy: los workers del pool no necesitan importar SciPy ni Flask.
+# El proceso principal prepara las frecuencias esperadas / la CDF y los workers solo simulan.
+
+DEFAULT_REPLICATES = 100_000
+MAX_REPLICATES = 1_000_000
+DEFAULT_SEED = 20240601
+DEFAULT_TIME_BUDGET = 5.0  # segundos
+MAX_TIME_BUDGET = 60.0
+# Semiamplitud del intervalo de confianza al 95 % a partir de la cual se detiene la simulación
+DEFAULT_TOLERANCE = 0.002
+# Réplicas mínimas antes de aplicar la parada temprana
+MIN_REPLICATES = 2_000
+# Elementos máximos de la matriz simulada por bloque (réplicas × categorías o tamaño de muestra)
+CHUNK_ELEMENTS = 2_000_000
+MAX_CHUNK_REPLICATES = 20_000
+Z_95 = 1.959963984540054
+
+_executor = None
+_executor_pid = None
+
+
+def num_workers():
+    return int(os.environ.get("MC_WORKERS", os.cpu_count() or 1))
+
+
+def get_executor():
+    # Pool perezoso por proceso: tras un fork (p. ej. workers de gunicorn) se crea uno nuevo.
+    # "forkserver" evita heredar hilos y locks del servidor web en los procesos hijos.
+    global _executor, _executor_pid
+    if _executor is None or _executor_pid != os.getpid():
+        start_method = os.environ.get("MC_START_METHOD", "forkserver" if os.name == "posix" else "spawn")
+        _executor = ProcessPoolExecutor(
+            max_workers=num_workers(), mp_context=multiprocessing.get_context(start_method)
+        )
+        _executor_pid = os.getpid()
+    return _executor
+
+
+def parse_options(data):
+    """Lee las opciones Monte Carlo de la petición; lanza ValueError si son inválidas."""
+    replicates = int(data.get('mcReplicates', DEFAULT_REPLICATES))
+    seed = int(data.get('mcSeed', DEFAULT_SEED))
+    time_budget = float(data.get('mcTimeBudget', DEFAULT_TIME_BUDGET))
+    tolerance = float(data.get('mcTolerance', DEFAULT_TOLERANCE))
+    if not 1 <= replicates <= MAX_REPLICATES:
+        raise ValueError(f"mcReplicates debe estar entre 1 y {MAX_REPLICATES}")
+    if not 0 < time_budget <= MAX_TIME_BUDGET:
+        raise ValueError(f"mcTimeBudget debe estar entre 0 y {MAX_TIME_BUDGET} segundos")
+    if seed < 0 or tolerance < 0:
+        raise ValueError("mcSeed y mcTolerance no pueden ser negativos")
+    return {"replicates": replicates, "seed": seed, "time_budget": time_budget, "tolerance": tolerance}
+
+
+def _simulate_statistics(kind, payload, rng, size):
+    if kind == 'chi_square':
+        # Las categorías agrupadas dependen solo de las esperadas, así que se simula
+        # directamente la multinomial sobre los grupos
+        expected = payload["expected"]
+        counts = rng.multinomial(payload["n"], expected / expected.sum(), size=size)
+        return ((counts - expected) ** 2 / expected).sum(axis=1)
+    if kind == 'ks_discrete':
+        # Soporte 0..K con la cola agrupada en K; mismo estadístico que kstest sobre enteros
+        cdf_values = payload["cdf"]
+        n = payload["n"]
+        counts = rng.multinomial(n, np.diff(cdf_values, prepend=0.0), size=size)
+        empirical = np.cumsum(counts, axis=1) / n
+        previous = np.concatenate([np.zeros((size, 1)), empirical[:, :-1]], axis=1)
+        return np.maximum((empirical - cdf_values).max(axis=1), (cdf_values - previous).max(axis=1))
+    if kind == 'ks_rounded':
+        # Normal redondeada a enteros con CDF continua: como en ks_statistic, D+ y D- solo se
+        # evalúan en los valores presentes en cada réplica
+        cdf_values = payload["cdf"]
+        n = payload["n"]
+        counts = rng.multinomial(n, payload["probabilities"], size=size)
+        cumulative = np.cumsum(counts, axis=1)
+        occupied = counts > 0
+        d_plus = np.where(occupied, cumulative / n - cdf_values, -np.inf).max(axis=1)
+        d_minus = np.where(occupied, cdf_values - (cumulative - counts) / n, -np.inf).max(axis=1)
+        return np.maximum(d_plus, d_minus)
+    if kind == 'ks_continuous':
+        # Para una nula continua D no depende de la distribución: basta con uniformes
+        n = payload["n"]
+        uniforms = np.sort(rng.random((size, n)), axis=1)
+        steps = np.arange(1, n + 1) / n
+        return np.maximum((steps - uniforms).max(axis=1), (uniforms - (steps - 1 / n)).max(axis=1))
+    raise ValueError(f"Tipo de simulación desconocido: {kind}")
+
+
+def _simulate_chunk(kind, payload, seed_sequence, size, observed_statistic):
+    rng = np.random.default_rng(seed_sequence)
+    statistics = _simulate_statistics(kind, payload, rng, size)
+    # Margen relativo para que los empates numéricos con el observado cuenten como extremos
+    threshold = observed_statistic - 1e-9 * max(1.0, abs(observed_statistic))
+    return int(np.count_nonzero(statistics >= threshold)), size
+
+
+def _chunk_size(kind, payload):
+    width = len(payload["expected"]) if kind == 'chi_square' else len(payload["cdf"]) if kind in ('ks_discrete', 'ks_rounded') else payload["n"]
+    return int(max(1, min(MAX_CHUNK_REPLICATES, CHUNK_ELEMENTS // max(width, 1))))
+
+
+def _wilson_interval(hits, total):
+    p_hat = hits / total
+    denominator = 1 + Z_95 ** 2 / total
+    center = (p_hat + Z_95 ** 2 / (2 * total)) / denominator
+    half_width = Z_95 * math.sqrt(p_hat * (1 - p_hat) / total + Z_95 ** 2 / (4 * total ** 2)) / denominator
+    return max(0.0, center - half_width), min(1.0, center + half_width)
+
+
+@timed('monte_carlo')
+def monte_carlo_pvalue(kind, payload, observed_statistic, replicates=DEFAULT_REPLICATES, seed=DEFAULT_SEED,
+                       time_budget=DEFAULT_TIME_BUDGET, tolerance=DEFAULT_TOLERANCE):
+    """P-valor por simulación paramétrica bajo la distribución hipotética.
+
+    Las réplicas se simulan en bloques vectorizados; cada bloque recibe su propia semilla
+    derivada de `seed` y los resultados se consumen en orden, por lo que con la misma
+    semilla se obtiene el mismo p-valor (salvo que se agote el presupuesto de tiempo).
+    La simulación se detiene al alcanzar `replicates`, al agotar `time_budget` o cuando
+    la semiamplitud del intervalo de confianza al 95 % es menor que `tolerance`.
+    """
+    deadline = time.monotonic() + time_budget
+    chunk = _chunk_size(kind, payload)
+    num_chunks = math.ceil(replicates / chunk)
+    seeds = np.random.SeedSequence(seed).spawn(num_chunks)
+    tasks = (
+        (kind, payload, seeds[i], min(chunk, replicates - i * chunk), observed_statistic)
+        for i in range(num_chunks)
+    )
+
+    hits = 0
+    done = 0
+    stopped = 'max_replicates'
+
+    def should_stop():
+        if done >= min(MIN_REPLICATES, replicates) and tolerance > 0:
+            low, high = _wilson_interval(hits, done)
+            if (high - low) / 2 <= tolerance:
+                return 'tolerance'
+        if time.monotonic() >= deadline:
+            return 'time_budget'
+        return None
+
+    workers = num_workers()
+    if workers <= 1:
+        for task in tasks:
+            chunk_hits, chunk_size = _simulate_chunk(*task)
+            hits += chunk_hits
+            done += chunk_size
+            reason = should_stop()
+            if reason and done < replicates:
+                stopped = reason
+                break
+    else:
+        executor = get_executor()
+        pending = deque()
+        for task in tasks:
+            pending.append(executor.submit(_simulate_chunk, *task))
+            if len(pending) >= 2 * workers:
+                break
+        while pending:
+            future = pending.popleft()
+            try:
+                # Siempre se espera al menos un bloque para poder dar un p-valor
+                timeout = None if done == 0 else max(0.0, deadline - time.monotonic())
+                chunk_hits, chunk_size = future.result(timeout=timeout)
+            except FutureTimeoutError:
+                stopped = 'time_budget'
+                break
+            hits += chunk_hits
+            done += chunk_size
+            reason = should_stop()
+            if reason and done < replicates:
+                stopped = reason
+                break
+            next_task = next(tasks, None)
+            if next_task is not None:
+                pending.append(executor.submit(_simulate_chunk, *next_task))
+        for future in pending:
+            future.cancel()
+
+    low, high = _wilson_interval(hits, done)
+    return {
+        # Estimador (1 + extremos) / (1 + réplicas): nunca devuelve un p-valor de cero
+        "p_value": (hits + 1) / (done + 1),
+        "replicates": done,
+        "confidence_interval": [low, high],
+        "stopped_by": stopped,
+    }
@@ -0,0 +1,154 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+import metrics
+from cache import cache_stats
+from distributions import (
+    DEFAULT_NUM_POINTS, poisson_curve, normal_curve, poisson_bin_probabilities, normal_bin_probabilities
+)
+
+# Modo de servicio multiproceso (gunicorn.conf.py + wsgi.py):
+#   - warm_up() carga SciPy y precalcula las tablas más pedidas antes del fork, de modo que
+#     los workers comparten esas páginas (copy-on-write) y la primera petición no paga el coste
+#   - run_analysis() ejecuta las pruebas costosas en un pool de procesos, para que el hilo del
+#     worker solo espere (sin retener el GIL) y /api/hello y los estáticos sigan respondiendo
+#
+# Con OFFLOAD_WORKERS=0 (por defecto con `python app.py`) todo se ejecuta en el mismo proceso.
+
+# Costo estimado (bins × casos, más el tamaño de muestra para K-S) a partir del cual se delega
+DEFAULT_OFFLOAD_THRESHOLD = 50_000
+DEFAULT_OFFLOAD_TIMEOUT = 120.0  # segundos
+
+# Tablas que el frontend pide por defecto o con parámetros habituales
+WARM_LAMBDAS = tuple(step / 2 for step in range(1, 21))  # 0.5, 1.0, ..., 10.0
+WARM_NORMAL_PARAMETERS = ((0.0, 1.0), (3.0, 1.5), (5.0, 2.0))
+WARM_NUM_BINS = (10,)
+
+_executor = None
+_executor_pid = None
+
+
+def offload_workers():
+    return int(os.environ.get("OFFLOAD_WORKERS", 0))
+
+
+def offload_threshold():
+    return int(os.environ.get("OFFLOAD_THRESHOLD", DEFAULT_OFFLOAD_THRESHOLD))
+
+
+def warm_up():
+    """Importa SciPy y llena la caché con las curvas y probabilidades más comunes.
+
+    Devuelve las estadísticas de la caché tras el precálculo.
+    """
+    import scipy.optimize  # noqa: F401  (ajuste de parámetros)
+    import scipy.signal  # noqa: F401  (p-valor exacto K-S discreto)
+    import scipy.special  # noqa: F401
+    import scipy.stats  # noqa: F401
+
+    for lambda_val in WARM_LAMBDAS:
+        poisson_curve(lambda_val)
+        for num_bins in WARM_NUM_BINS:
+            poisson_bin_probabilities(lambda_val, num_bins)
+    for mean_val, std_dev_val in WARM_NORMAL_PARAMETERS:
+        normal_curve(mean_val, std_dev_val, DEFAULT_NUM_POINTS)
+        for num_bins in WARM_NUM_BINS:
+            normal_bin_probabilities(mean_val, std_dev_val, num_bins)
+    return cache_stats()
+
+
+def _initialize_worker():
+    # Los workers del pool parten del forkserver, que ya tiene los módulos importados;
+    # solo les falta su propia copia de las tablas precalculadas
+    warm_up()
+
+
+def get_executor():
+    # Pool perezoso por proceso, igual que el de montecarlo.py: cada worker de gunicorn crea el suyo
+    global _executor, _executor_pid
+    if _executor is None or _executor_pid != os.getpid():
+        start_method = os.environ.get("OFFLOAD_START_METHOD", "forkserver" if os.name == "posix" else "spawn")
+        context = multiprocessing.get_context(start_method)
+        if start_method == "forkserver":
+            # Solo tiene efecto si el forkserver aún no arrancó (lo comparte con Monte Carlo)
+            context.set_forkserver_preload(["analysis", "scipy.stats", "scipy.optimize", "scipy.signal"])
+        _executor = ProcessPoolExecutor(
+            max_workers=offload_workers(), mp_context=context, initializer=_initialize_worker
+        )
+        _executor_pid = os.getpid()
+    return _executor
+
+
+def request_cost(data):
+    """Estimación del trabajo de una petición de pruebas: bins × casos (+ muestra si hay K-S).
+
+    Solo estima: las entradas malformadas no cuentan y la validación queda en analysis.
+    """
+    observed = data.get('observedData')
+    if not isinstance(observed, list):
+        return 0
+    observed_sets = observed if observed and isinstance(observed[0], list) else [observed]
+    observed_sets = [counts for counts in observed_sets if isinstance(counts, list)]
+    parameter_sets = data.get('parameterSets')
+    tests = data.get('tests') or [data.get('testType')]
+    cases = (len(parameter_sets) if isinstance(parameter_sets, list) else 1) * (len(tests) if isinstance(tests, list) else 1)
+    cost = sum(len(counts) for counts in observed_sets) * cases
+    if isinstance(tests, list) and 'kolmogorov_smirnov' in tests:
+        # El p-valor exacto discreto crece con el tamaño de la muestra
+        try:
+            cost += int(sum(sum(counts) for counts in observed_sets))
+        except (TypeError, ValueError, OverflowError):
+            pass
+    return cost
+
+
+def should_offload(data):
+    if offload_workers() <= 0 or not isinstance(data, dict):
+        return False
+    # Monte Carlo ya reparte la simulación en su propio pool desde el proceso web
+    if data.get('pValueMethod') == 'monte_carlo' or metrics.profiling_active():
+        return False
+    return request_cost(data) >= offload_threshold()
+
+
+def run_analysis(func, data):
+    """Ejecuta func(data) -> (respuesta, código), en el pool si la petición es costosa."""
+    global _executor
+    if not should_offload(data):
+        return func(data)
+    timeout = float(os.environ.get("OFFLOAD_TIMEOUT", DEFAULT_OFFLOAD_TIMEOUT))
+    try:
+        future = get_executor().submit(metrics.run_collecting_stages, func, data)
+        with metrics.stage("offload"):
+            result, stages = future.result(timeout=timeout)
+        for name, seconds in stages:
+            metrics.record_stage(name, seconds)
+        return result
+    except FutureTimeoutError:
+        # cancel() no detiene una tarea en curso: el worker seguiría ocupado hasta terminarla,
+        # así que se descarta el pool y el siguiente se crea limpio
+        _discard_executor()
+        return {"error": f"La prueba superó el tiempo máximo de {timeout:g} s"}, 503
+    except BrokenProcessPool:
+        # Un worker del pool murió (p. ej. por memoria): se recrea el pool y se calcula aquí
+        _executor = None
+        return func(data)
+
+
+def _discard_executor():
+    global _executor
+    if _executor is not None and _executor_pid == os.getpid():
+        processes = list((_executor._processes or {}).values())
+        _executor.shutdown(wait=False, cancel_futures=True)
+        for process in processes:
+            process.terminate()
+    _executor = None
+
+
+def shutdown():
+    global _executor
+    if _executor is not None and _executor_pid == os.getpid():
+        _executor.shutdown(wait=False, cancel_futures=True)
+    _executor = None
@@ -0,0 +1,12 @@
+import gc
+
+from app import app
+from serving import warm_up
+
+# Punto de entrada para gunicorn (ver gunicorn.conf.py). Con preload_app el módulo se importa
+# una sola vez en el proceso maestro: SciPy y las tablas precalculadas quedan en memoria antes
+# del fork y los workers las comparten sin volver a cargarlas.
+warm_up()
+# Mover los objetos ya creados a la generación permanente evita que el recolector los toque
+# en los workers, lo que rompería el copy-on-write de esas páginas
+gc.freeze()